@@ -1,26 +1,41 @@
-from fastapi import FastAPI, Request, Form
+import asyncio
+from fastapi import FastAPI, Request, Form, File, UploadFile
+from fastapi.responses import Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-import requests
-from bs4 import BeautifulSoup
-import re
 from typing import Optional
 import os
-import requests
-from dotenv import load_dotenv
+import gzip
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import menu_engine
+from deadline import Deadline, REQUEST_DEADLINE
+from llm_scheduler import BATCH
+from menu_engine import (
+    CLASSIFIER_BACKEND, FILTER_BACKEND, LLM_MODEL, LLM_STRUCTURED_OUTPUT, LLM_TEMPERATURE,
+    OPENAI_API_KEY, USE_LLM, get_backend,
+)
+from prewarm import PREWARM_ENABLED, PopularityTracker, PrewarmScheduler
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - gzip is always available
+    brotli = None
 
 app = FastAPI(title="Vegan Menu Filter", description="Filter restaurant menus for vegan and vegetarian options")
 
-# Load environment variables
-load_dotenv()
-
-# Store OpenAI API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Configuration
-USE_LLM = os.getenv("USE_LLM", "false").lower() == "true"
-LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
-LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+# Result page settings
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "50"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# Pre-warmed results are made off-peak, so they need to last into the busy hours
+PREWARM_RESULT_TTL = float(os.getenv("PREWARM_RESULT_TTL", str(24 * 3600)))
+# Pre-warming isn't user-facing, so it gets a more generous latency budget
+PREWARM_DEADLINE = float(os.getenv("PREWARM_DEADLINE", "120"))
+COMPRESS_MIN_SIZE = 500  # Smaller bodies aren't worth compressing
 
 # Debug: Print configuration on startup
 print(f"🤖 LLM Configuration:")
@@ -28,436 +43,200 @@ print(f"   USE_LLM: {USE_LLM}")
 print(f"   API_KEY_SET: {'YES' if OPENAI_API_KEY else 'NO'}")
 print(f"   MODEL: {LLM_MODEL}")
 print(f"   TEMPERATURE: {LLM_TEMPERATURE}")
+print(f"   STRUCTURED_OUTPUT: {LLM_STRUCTURED_OUTPUT}")
+print(f"   FILTER_BACKEND: {FILTER_BACKEND}")
+print(f"   CLASSIFIER_BACKEND: {CLASSIFIER_BACKEND}")
+print(f"   REQUEST_DEADLINE: {REQUEST_DEADLINE}s")
 
 # Mount templates and static files
 templates = Jinja2Templates(directory="templates")
 
-# Keywords that indicate vegan items
-VEGAN_KEYWORDS = [
-    'vegan', 'plant-based', 'plant based', 'no dairy', 'no eggs',
-    'dairy-free', 'dairy free', 'egg-free', 'egg free'
-]
-
-# Keywords that indicate vegetarian items
-VEGETARIAN_KEYWORDS = [
-    'vegetarian', 'veggie', 'no meat', 'meat-free', 'meat free'
-]
-
-# Keywords that indicate non-vegan items (things to avoid for vegan filter)
-NON_VEGAN_KEYWORDS = [
-    'beef', 'pork', 'chicken', 'turkey', 'lamb', 'fish', 'seafood',
-    'salmon', 'tuna', 'shrimp', 'crab', 'lobster', 'scallops', 'clams',
-    'meat', 'bacon', 'sausage', 'ham', 'steak', 'burger', 'cheese',
-    'milk', 'butter', 'cream', 'egg', 'eggs', 'yogurt', 'yoghurt'
-]
-
-
-def classify_menu_item_keywords(item_text: str) -> dict:
-    """
-    Classify menu item using keyword matching (fallback method)
+# Finished results, keyed by result_cache_key(). Entries are evicted LRU-first
+# and expire after their ttl (RESULT_CACHE_TTL unless pre-warmed). The lock
+# is needed because the pre-warm thread writes to the cache too.
+RESULT_CACHE = OrderedDict()
+RESULT_CACHE_LOCK = threading.Lock()
+
+def result_cache_key(input_type: str, filter_type: str, source: str) -> str:
+    """Build a stable key for a filtering request (input + filter + backend)"""
+    engine_backend = get_backend()
+    backend = f"{engine_backend.name}:{LLM_MODEL}" if engine_backend.uses_llm else engine_backend.name
+    digest = hashlib.sha256()
+    for part in (input_type, filter_type, backend, source):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_cached_result(key: str, allow_degraded: bool = True) -> Optional[dict]:
+    """Return a cached result entry, or None if missing or expired"""
+    with RESULT_CACHE_LOCK:
+        entry = RESULT_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry["degraded"] and not allow_degraded:
+            # Degraded results can still be paged through, but a new request
+            # should get another chance at the full answer
+            return None
+        if time.time() - entry["created"] > entry["ttl"]:
+            del RESULT_CACHE[key]
+            return None
+        RESULT_CACHE.move_to_end(key)
+        return entry
+
+def store_result(key: str, filter_type: str, items: list, degraded_reason: Optional[str] = None,
+                 ttl: float = RESULT_CACHE_TTL) -> dict:
+    """Cache a finished result so its pages can be served without re-filtering"""
+    entry = {"filter_type": filter_type, "items": items, "created": time.time(),
+             "degraded": degraded_reason is not None, "degraded_reason": degraded_reason, "ttl": ttl}
+    with RESULT_CACHE_LOCK:
+        RESULT_CACHE[key] = entry
+        RESULT_CACHE.move_to_end(key)
+        while len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+            RESULT_CACHE.popitem(last=False)
+    return entry
+
+# Popular restaurant URLs, kept warm in the cache by a background thread
+POPULARITY = PopularityTracker()
+
+def record_popularity(url: str, filter_type: str) -> None:
+    """Count a successful URL request towards pre-warming (only tracked when it's enabled)"""
+    if PREWARM_ENABLED:
+        POPULARITY.record(url, filter_type)
+
+def prewarm_needs_refresh(url: str, filter_type: str) -> bool:
+    """A popular URL needs refreshing if it isn't cached or is past half its lifetime"""
+    entry = get_cached_result(result_cache_key('url', filter_type, url), allow_degraded=False)
+    if entry is None:
+        return True
+    return time.time() - entry["created"] > entry["ttl"] / 2
+
+def prewarm_url(url: str, filter_type: str) -> int:
+    """Re-fetch and reclassify a popular menu ahead of demand. Returns the number of LLM calls sent."""
+    deadline = Deadline(PREWARM_DEADLINE)
+    items, error_message = menu_engine.run_filter_request(
+        {"input_type": "url", "filter_type": filter_type, "menu_url": url}, deadline, priority=BATCH)
+    if error_message is not None:
+        print(f"⚠️  Pre-warm fetch failed for {url}: {error_message}")
+        return deadline.llm_calls
+    if not deadline.degraded:
+        store_result(result_cache_key('url', filter_type, url), filter_type, items, ttl=PREWARM_RESULT_TTL)
+    return deadline.llm_calls
+
+PREWARM_SCHEDULER = PrewarmScheduler(POPULARITY, prewarm_url, prewarm_needs_refresh)
+
+@app.on_event("startup")
+async def start_prewarm():
+    if PREWARM_ENABLED:
+        print("🔥 Starting background pre-warm scheduler")
+        PREWARM_SCHEDULER.start()
+
+@app.on_event("shutdown")
+async def stop_prewarm():
+    PREWARM_SCHEDULER.stop()
+
+def result_etag(key: str, entry: dict, page: int) -> str:
     """
-    item_lower = item_text.lower()
-
-    # Check for explicit labels
-    is_vegan = any(keyword in item_lower for keyword in VEGAN_KEYWORDS)
-    is_vegetarian = any(keyword in item_lower for keyword in VEGAN_KEYWORDS + VEGETARIAN_KEYWORDS)
-
-    # Check for non-vegan ingredients
-    has_non_vegan = any(keyword in item_lower for keyword in NON_VEGAN_KEYWORDS)
-
-    # If explicitly labeled, trust the label
-    if is_vegan:
-        return {"is_vegan": True, "is_vegetarian": True, "reason": "explicitly labeled vegan"}
-    elif is_vegetarian:
-        return {"is_vegan": False, "is_vegetarian": True, "reason": "explicitly labeled vegetarian"}
-
-    # If no non-vegan keywords found, assume vegan (conservative)
-    if not has_non_vegan:
-        return {"is_vegan": True, "is_vegetarian": True, "reason": "no animal products detected"}
-
-    # Check for meat specifically for vegetarian classification
-    meat_keywords = ['beef', 'pork', 'chicken', 'turkey', 'lamb', 'fish', 'seafood', 'meat', 'bacon', 'sausage', 'ham', 'steak']
-    has_meat = any(keyword in item_lower for keyword in meat_keywords)
-
-    if not has_meat:
-        return {"is_vegan": False, "is_vegetarian": True, "reason": "no meat detected, may contain dairy/eggs"}
-    else:
-        return {"is_vegan": False, "is_vegetarian": False, "reason": "contains meat"}
-
-def extract_menu_text(url: str) -> str:
-    """Extract raw text content from a webpage - no processing"""
-    try:
-        # Add headers to appear more like a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        }
-
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
-        response.raise_for_status()
-
-        # Get raw text without any processing
-        soup = BeautifulSoup(response.content, 'html5lib')
-        
-        # Remove only script and style tags to get clean text
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get all text - let LLM handle the filtering
-        raw_text = soup.get_text(separator='\n', strip=True)
-        
-        print(f"📄 Extracted {len(raw_text)} characters of raw text from URL")
-        return raw_text
-
-    except requests.exceptions.RequestException as e:
-        return f"Error fetching menu: Network error - {str(e)}"
-    except Exception as e:
-        return f"Error fetching menu: {str(e)}"
-
-def filter_menu_items(menu_text: str, filter_type: str) -> list:
+    ETag for one page of a cached result. It is weak because the same page
+    is sent gzip, brotli or uncompressed, and those bodies differ byte for byte.
     """
-    Filter menu items using LLM to analyze entire menu and return only matching items
-    """
-    print(f"\n{'='*60}")
-    print(f"🤖 filter_menu_items called")
-    print(f"{'='*60}")
-    print(f"Menu text length: {len(menu_text)} characters")
-    print(f"Filter type: {filter_type}")
-    print(f"Menu text content (first 500 chars):\n{menu_text[:500]}")
-    print(f"Full menu text:\n{repr(menu_text)}")
-    print(f"{'='*60}\n")
-
-    try:
-        if USE_LLM:
-            print(f"🧠 Using LLM filtering for filter_type={filter_type}")
-            result = filter_menu_with_llm(menu_text, filter_type)
-            print(f"🔵 filter_menu_with_llm returned: {type(result)}, length: {len(result) if result else 'None'}")
-        else:
-            print(f"🔤 Using keyword filtering for filter_type={filter_type}")
-            result = filter_menu_with_keywords(menu_text, filter_type)
-            print(f"🔵 filter_menu_with_keywords returned: {type(result)}, length: {len(result) if result else 'None'}")
-
-        # Ensure we always return a list
-        if result is None:
-            print("⚠️  Function returned None, using empty list")
-            return []
-        if not isinstance(result, list):
-            print(f"⚠️  Function returned {type(result)} instead of list, converting to empty list")
-            return []
-        
-        print(f"✅ filter_menu_items returning {len(result)} items")
-        return result
-    except Exception as e:
-        print(f"❌ filter_menu_items failed: {e}")
-        import traceback
-        print(f"🐛 Full traceback: {traceback.format_exc()}")
-        # Ultimate fallback - return empty list
-        return []
-
-def filter_menu_with_llm(menu_text: str, filter_type: str) -> list:
-    """
-    Use LLM to analyze entire menu and extract only items matching the filter criteria
-    """
-    print(f"🔵 Entered filter_menu_with_llm with filter_type={filter_type}")
-    
-    # Truncate menu text to prevent LLM overload
-    truncated_menu = menu_text
-
-    print(f"🧠 Sending menu to LLM for {filter_type} filtering...")
-
-    if not OPENAI_API_KEY:
-        print("⚠️  No OpenAI API key, falling back to keyword filtering")
-        result = filter_menu_with_keywords(menu_text, filter_type)
-        print(f"🔙 Keyword filtering returned {len(result) if result else 0} items")
-        return result if result else []
-
-    # Debug: Show menu preview
-    menu_preview = menu_text[:200] + "..." if len(menu_text) > 200 else menu_text
-    print(f"📄 Menu preview: {menu_preview.replace(chr(10), ' | ')}")
-    print(f"📏 Full menu text length: {len(menu_text)} characters")
-    print(f"📏 Menu text content (first 500 chars):\n{menu_text[:500]}")
-
-    # Define filter criteria based on type
-    if filter_type == 'all':
-        # For "all items", we want to extract all menu items without filtering
-        print("🔄 Calling extract_all_menu_items_llm for 'all' filter")
-        result = extract_all_menu_items_llm(menu_text)
-        print(f"🔵 extract_all_menu_items_llm returned {len(result) if result else 0} items")
-        return result if result else []
-    
-    print(f"📝 Building plain text prompt for filter_type={filter_type}")
-    
-    # Build simple prompt that returns plain text list
-    if filter_type == 'vegetarian':
-        prompt = f"""Look at this restaurant menu text and list ONLY the vegetarian dishes (no meat/fish/seafood).
-
-List each item on a new line. Include the price if visible.
-
-Menu Text:
-{menu_text}
-
-Your response (just list the items, one per line):"""
-    elif filter_type == 'vegan':
-        prompt = f"""Look at this restaurant menu text and list ONLY the vegan dishes (no animal products).
-
-List each item on a new line. Include the price if visible.
-
-Menu Text:
-{menu_text}
-
-Your response (just list the items, one per line):"""
-    elif filter_type == 'nonvegetarian':
-        prompt = f"""Look at this restaurant menu text and list ONLY the dishes with meat, fish, or seafood.
-
-List each item on a new line. Include the price if visible.
-
-Menu Text:
-{menu_text}
-
-Your response (just list the items, one per line):"""
-    else:
-        print(f"⚠️  Unknown filter_type: {filter_type}, using keyword filtering")
-        result = filter_menu_with_keywords(menu_text, filter_type)
-        return result if result else []
-    
-    print(f"✅ Created prompt of {len(prompt)} characters")
-    print(f"📋 Prompt preview (first 500 chars):\n{prompt[:500]}...")
-
-    try:
-        # Make direct API call to OpenAI
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": LLM_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": LLM_TEMPERATURE,
-            "max_tokens": 2000  # More tokens for plain text response
-        }
-
-        print(f"🔗 Calling OpenAI API...")
-        print(f"   Model: {LLM_MODEL}")
-        print(f"   API Key: {OPENAI_API_KEY[:10]}...{OPENAI_API_KEY[-4:] if OPENAI_API_KEY and len(OPENAI_API_KEY) > 14 else 'INVALID'}")
-        print(f"   Endpoint: {url}")
-        print(f"   Prompt length: {len(prompt)} characters")
-        
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        print(f"📊 Response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ API Error Response:")
-            print(response.text)
-            return filter_menu_with_keywords(menu_text, filter_type)
-        
-        response.raise_for_status()
-        print(f"✅ API call successful!")
-
-        result = response.json()
-        result_text = result["choices"][0]["message"]["content"].strip()
-        
-        print(f"\n{'='*60}")
-        print(f"📨 RAW LLM OUTPUT ({len(result_text)} characters):")
-        print(f"{'='*60}")
-        print(result_text)
-        print(f"{'='*60}\n")
-
-        # Parse plain text response - each line is a menu item
-        filtered_items = []
-        lines = result_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            # Skip empty lines, numbers, or very short text
-            if not line or len(line) < 5:
-                continue
-            # Skip lines that look like headings or instructions
-            if line.endswith(':') or line.lower().startswith('here') or line.lower().startswith('note'):
-                continue
-            # Clean up markdown/bullets
-            line = line.lstrip('*-•123456789. ')
-            
-            if line:
-                filtered_items.append((line, f"{filter_type} (LLM)"))
-
-        print(f"✅ LLM returned {len(filtered_items)} {filter_type} items after conversion")
-        # Debug: Show first few results
-        if filtered_items:
-            print(f"📋 Sample results: {filtered_items[:3]}")
-        else:
-            print(f"⚠️  No items after conversion - LLM returned empty list or invalid format")
-        
-        print(f"🔵 filter_menu_with_llm returning list with {len(filtered_items)} items")
-        return filtered_items
-
-    except Exception as e:
-        print(f"❌ LLM filtering failed: {e}")
-        import traceback
-        print(f"🐛 Full traceback: {traceback.format_exc()}")
-        print(f"🔄 Falling back to keyword filtering for {filter_type}")
-        # Fallback to keyword filtering
-        result = filter_menu_with_keywords(menu_text, filter_type)
-        print(f"📝 Keyword filtering returned {len(result) if result else 0} items")
-        return result if result else []
-
-def extract_all_menu_items_llm(menu_text: str) -> list:
-    """
-    Use LLM to extract ALL menu items without filtering
-    """
-    print("🔵 Entered extract_all_menu_items_llm")
-
-    if not OPENAI_API_KEY:
-        print("⚠️  No OpenAI API key, falling back to keyword extraction")
-        result = filter_menu_with_keywords(menu_text, 'all')
-        print(f"🔙 Keyword extraction returned {len(result) if result else 0} items")
-        return result if result else []
-
-    prompt = f"""Look at this restaurant menu/webpage text and list ALL the food dishes you find.
-
-List each item on a new line. Include prices if you see them.
-
-Text:
-{menu_text}
-
-Your response (just list the items, one per line):"""
-
-    try:
-        # Make direct API call to OpenAI
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": LLM_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": LLM_TEMPERATURE,
-            "max_tokens": 2000  # More tokens for plain text
-        }
-
-        print(f"🔗 Calling OpenAI API to extract all items...")
-        print(f"   Model: {LLM_MODEL}")
-        print(f"   API Key: {OPENAI_API_KEY[:10]}...{OPENAI_API_KEY[-4:] if OPENAI_API_KEY and len(OPENAI_API_KEY) > 14 else 'INVALID'}")
-        print(f"   Prompt length: {len(prompt)} characters")
-        
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        print(f"📊 Response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ API Error Response:")
-            print(response.text)
-            return filter_menu_with_keywords(menu_text, 'all')
-        
-        response.raise_for_status()
-        print(f"✅ API call successful!")
-
-        result = response.json()
-        result_text = result["choices"][0]["message"]["content"].strip()
-        
-        print(f"\n{'='*60}")
-        print(f"📨 RAW LLM OUTPUT FOR 'ALL ITEMS' ({len(result_text)} characters):")
-        print(f"{'='*60}")
-        print(result_text)
-        print(f"{'='*60}\n")
-
-        # Parse plain text response - each line is a menu item
-        filtered_items = []
-        lines = result_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            # Skip empty lines or very short text
-            if not line or len(line) < 5:
-                continue
-            # Skip headings or instructions
-            if line.endswith(':') or line.lower().startswith('here') or line.lower().startswith('note'):
-                continue
-            # Clean up markdown/bullets
-            line = line.lstrip('*-•123456789. ')
-            
-            if line:
-                filtered_items.append((line, "all items (LLM)"))
-
-        print(f"✅ LLM extracted {len(filtered_items)} total menu items")
-        # Debug: Show first few results
-        if filtered_items:
-            print(f"📋 Sample extracted items: {filtered_items[:3]}")
-        else:
-            print(f"⚠️  No items extracted - check LLM response format")
-        
-        print(f"🔵 extract_all_menu_items_llm returning {len(filtered_items)} items")
-        return filtered_items
-
-    except Exception as e:
-        print(f"❌ LLM extraction failed: {e}")
-        import traceback
-        print(f"🐛 Full traceback: {traceback.format_exc()}")
-        # Fallback to keyword extraction
-        result = filter_menu_with_keywords(menu_text, 'all')
-        print(f"🔙 Keyword extraction fallback returned {len(result) if result else 0} items")
-        return result if result else []
-
-def filter_menu_with_keywords(menu_text: str, filter_type: str) -> list:
+    return f'W/"{key[:32]}-{int(entry["created"] * 1000)}-p{page}"'
+
+def paginate(items: list, page: int) -> tuple:
+    """Slice items for the requested page, returning (page_items, page, total_pages)"""
+    total_pages = max(1, -(-len(items) // RESULTS_PAGE_SIZE))
+    page = min(max(page, 1), total_pages)
+    start = (page - 1) * RESULTS_PAGE_SIZE
+    return items[start:start + RESULTS_PAGE_SIZE], page, total_pages
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the If-None-Match header against our ETag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def choose_encoding(request: Request) -> Optional[str]:
+    """Pick the best response encoding the client accepts"""
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def render_page(request: Request, context: dict, etag: Optional[str] = None, status_code: int = 200) -> Response:
     """
-    Traditional keyword-based filtering as fallback
+    Render index.html with compression and (optionally) an ETag.
+    Only GET responses carry the ETag or answer 304: a POST always runs and
+    renders the form, so it must never be served from a conditional match.
     """
-    print(f"🔤 Using keyword filtering for {filter_type} items")
-
-    # Split text into potential menu items (by lines, then by common separators)
-    lines = menu_text.split('\n')
-    menu_items = []
-
-    for line in lines:
-        line = line.strip()
-        if len(line) < 10 or len(line) > 200:  # Skip very short or very long lines
-            continue
-
-        # Look for price patterns to identify menu items
-        if re.search(r'\$[\d.]+|\d+\.\d{2}', line):
-            menu_items.append(line)
-
-    filtered_items = []
-
-    for item in menu_items:
-        classification = classify_menu_item_keywords(item)
-
-        is_vegan = classification['is_vegan']
-        is_vegetarian = classification['is_vegetarian']
-        reason = classification['reason']
-
-        # Apply filter based on type
-        should_include = False
-
-        if filter_type == 'vegan' and is_vegan:
-            should_include = True
-        elif filter_type == 'vegetarian' and is_vegetarian:
-            should_include = True
-        elif filter_type == 'nonvegetarian' and not is_vegetarian:
-            should_include = True
-        elif filter_type == 'all':
-            should_include = True
-
-        if should_include:
-            full_reason = f"{reason} (Keywords)"
-            filtered_items.append((item, full_reason))
-
-    print(f"📝 Keywords found {len(filtered_items)} {filter_type} items")
-    return filtered_items
-
-@app.get("/")
-async def home(request: Request):
-    """Display the main menu filter page"""
-    return templates.TemplateResponse("index.html", {
+    headers = {"Vary": "Accept-Encoding"}
+    if etag and request.method == "GET":
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "private, no-cache"
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    context = {
         "request": request,
         "filtered_items": [],
         "filter_type": "all",
         "error_message": None,
         "menu_url": "",
-        "menu_text": ""
-    })
+        "menu_text": "",
+        "total_items": 0,
+        "page": 1,
+        "total_pages": 1,
+        "result_key": None,
+        "degraded": False,
+        "degraded_reason": None,
+        **context,
+    }
+    body = templates.get_template("index.html").render(context).encode("utf-8")
+
+    encoding = choose_encoding(request) if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding == "br":
+        body = brotli.compress(body)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="text/html", headers=headers)
+
+def render_result(request: Request, key: str, entry: dict, page: int, menu_url: str = "") -> Response:
+    """Render one page of a cached result"""
+    page_items, page, total_pages = paginate(entry["items"], page)
+    return render_page(request, {
+        "filtered_items": page_items,
+        "filter_type": entry["filter_type"],
+        "menu_url": menu_url,
+        "total_items": len(entry["items"]),
+        "page": page,
+        "total_pages": total_pages,
+        "result_key": key,
+        "degraded": entry["degraded"],
+        "degraded_reason": entry["degraded_reason"],
+    }, etag=result_etag(key, entry, page))
+
+@app.get("/")
+async def home(request: Request):
+    """Display the main menu filter page"""
+    return render_page(request, {})
+
+@app.get("/results/{key}")
+async def results_page(request: Request, key: str, page: int = 1):
+    """Serve another page of a previously filtered menu"""
+    entry = get_cached_result(key)
+    if entry is None:
+        return render_page(request, {
+            "error_message": "These results have expired. Please filter the menu again."
+        }, status_code=404)
+    return render_result(request, key, entry, page)
 
 @app.post("/")
 async def filter_menu(
@@ -465,11 +244,12 @@ async def filter_menu(
     filter_type: str = Form("all"),
     input_type: str = Form(...),
     menu_url: Optional[str] = Form(""),
-    menu_text: Optional[str] = Form("")
+    menu_text: Optional[str] = Form(""),
+    menu_file: Optional[UploadFile] = File(None)
 ):
     """Process the menu filtering request"""
-    filtered_items = []
     error_message = None
+    deadline = Deadline()
 
     # Debug: Print received form data
     print(f"DEBUG - input_type: '{input_type}', menu_url: '{menu_url}', menu_text: '{menu_text[:50] if menu_text else ''}...'")
@@ -478,21 +258,44 @@ async def filter_menu(
         url = (menu_url or "").strip()
         print(f"DEBUG - Processing URL: '{url}'")
         if url:
-            menu_content = extract_menu_text(url)
-            if menu_content.startswith('Error'):
-                error_message = menu_content
-            else:
-                # Debug: show first 500 characters of extracted content
-                print(f"Extracted content preview: {menu_content[:500]}...")
-                filtered_items = filter_menu_items(menu_content, filter_type)
-                if filtered_items is None:
-                    filtered_items = []
-                    print("⚠️  Warning: filter_menu_items returned None, using empty list")
+            key = result_cache_key(input_type, filter_type, url)
+            entry = get_cached_result(key, allow_degraded=False)
+            if entry is not None:
+                print(f"♻️  Serving cached result {key[:12]} for URL")
+                record_popularity(url, filter_type)
+                return render_result(request, key, entry, 1, menu_url=url)
+
+            filtered_items, error_message = await menu_engine.arun_captured_request(
+                {"input_type": "url", "filter_type": filter_type, "menu_url": url}, deadline)
+            if error_message is None:
                 print(f"Found {len(filtered_items)} filtered items")
+                # Only URLs that actually fetched are worth keeping warm
+                record_popularity(url, filter_type)
+                entry = store_result(key, filter_type, filtered_items, degraded_reason=deadline.degraded_reason)
+                return render_result(request, key, entry, 1, menu_url=url)
         else:
             error_message = "Please enter a URL"
             print("DEBUG - No URL provided")
 
+    elif input_type == 'text' and menu_file is not None and menu_file.filename:
+        # Uploads are spooled to disk by the form parser and streamed from there
+        digest, size = await asyncio.to_thread(menu_engine.hash_upload, menu_file.file)
+        print(f"DEBUG - Processing uploaded file '{menu_file.filename}' ({size} bytes)")
+        if size:
+            key = result_cache_key(input_type, filter_type, f"file:{digest}")
+            entry = get_cached_result(key, allow_degraded=False)
+            if entry is not None:
+                print(f"♻️  Serving cached result {key[:12]} for upload")
+                return render_result(request, key, entry, 1)
+
+            filtered_items, _ = await menu_engine.arun_captured_request(
+                {"input_type": "upload", "filter_type": filter_type}, deadline, upload=(menu_file.file, size))
+            print(f"Found {len(filtered_items)} filtered items from upload")
+            entry = store_result(key, filter_type, filtered_items, degraded_reason=deadline.degraded_reason)
+            return render_result(request, key, entry, 1)
+        else:
+            error_message = "The uploaded file is empty"
+
     elif input_type == 'text':
         text = (menu_text or "").strip()
         print(f"\n{'='*60}")
@@ -500,15 +303,20 @@ async def filter_menu(
         print(f"{'='*60}")
         print(f"Text length: {len(text)}")
         print(f"Text content (first 500 chars):\n{text[:500]}")
-        print(f"Full text:\n{repr(text)}")
         print(f"{'='*60}\n")
-        
+
         if text:
-            filtered_items = filter_menu_items(text, filter_type)
-            if filtered_items is None:
-                filtered_items = []
-                print("⚠️  Warning: filter_menu_items returned None, using empty list")
+            key = result_cache_key(input_type, filter_type, text)
+            entry = get_cached_result(key, allow_degraded=False)
+            if entry is not None:
+                print(f"♻️  Serving cached result {key[:12]} for text")
+                return render_result(request, key, entry, 1)
+
+            filtered_items, _ = await menu_engine.arun_captured_request(
+                {"input_type": "text", "filter_type": filter_type, "menu_text": text}, deadline)
             print(f"Found {len(filtered_items)} filtered items from text")
+            entry = store_result(key, filter_type, filtered_items, degraded_reason=deadline.degraded_reason)
+            return render_result(request, key, entry, 1)
         else:
             error_message = "Please enter menu text"
             print("DEBUG - No text provided")
@@ -516,13 +324,11 @@ async def filter_menu(
         error_message = f"Invalid input type: {input_type}. Please select URL or Text input."
         print(f"DEBUG - Invalid input_type: {input_type}")
 
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "filtered_items": filtered_items,
+    # The pasted menu is not echoed back - it can be larger than the result itself
+    return render_page(request, {
         "filter_type": filter_type,
         "error_message": error_message,
         "menu_url": menu_url or "",
-        "menu_text": menu_text or ""
     })
 
 if __name__ == "__main__":
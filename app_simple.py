@@ -1,81 +1,23 @@
 from fastapi import FastAPI, Form
 from fastapi.responses import HTMLResponse
-import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+import menu_engine
+from deadline import Deadline
 
 app = FastAPI()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-def filter_vegan_items(menu_text: str) -> list:
-    """Simple function to filter vegan items using OpenAI"""
+async def filter_vegan_items(menu_text: str) -> list:
+    """Simple function to filter vegan items with the shared engine's LLM backend"""
     
     print(f"\n🔵 filter_vegan_items called with menu_text length: {len(menu_text)}")
-    print(f"Menu text content:\n{repr(menu_text)}")
     
     if not menu_text or len(menu_text.strip()) == 0:
         print("❌ ERROR: menu_text is empty!")
         return []
     
-    prompt = f"""Look at this menu and list ONLY the vegan dishes (no animal products).
-
-Menu:
-{menu_text}
-
-Your response (just list the vegan items, one per line):"""
-
-    print(f"\n🔗 Calling OpenAI API...")
-    print(f"API Key: {OPENAI_API_KEY[:15]}...")
-    print(f"Full prompt length: {len(prompt)}")
-    print(f"Prompt preview:\n{prompt[:500]}...")
-    
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "gpt-4o",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.1,
-        "max_tokens": 2000
-    }
-
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        print(f"Response Status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ API Error: {response.text}")
-            return []
-        
-        result = response.json()
-        result_text = result["choices"][0]["message"]["content"].strip()
-        
-        print("\n" + "="*60)
-        print("RAW LLM OUTPUT:")
-        print("="*60)
-        print(result_text)
-        print("="*60 + "\n")
-        
-        # Parse lines
-        items = []
-        for line in result_text.split('\n'):
-            line = line.strip().lstrip('*-•123456789. ')
-            if line and len(line) > 3:
-                items.append(line)
-        
-        print(f"✅ Found {len(items)} vegan items")
-        return items
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        print(traceback.format_exc())
-        return []
+    items = await menu_engine.afilter_menu_items(menu_text, "vegan", Deadline(), backend="llm")
+    print(f"✅ Found {len(items)} vegan items")
+    return items
 
 @app.get("/", response_class=HTMLResponse)
 async def home():
@@ -116,9 +58,12 @@ async def test(menu: str = Form("")):
         </html>
         """)
     
-    vegan_items = filter_vegan_items(menu)
+    vegan_items = await filter_vegan_items(menu)
     
-    results_html = "<br>".join([f"✅ {item}" for item in vegan_items])
+    results_html = "<br>".join([
+        f"✅ {item.name}" + (f" ${item.price:.2f}" if item.price is not None else "")
+        for item in vegan_items
+    ])
     if not vegan_items:
         results_html = "❌ No vegan items found"
     
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak memory of the keyword pipeline on large menu text.
+
+Each size is run in a fresh subprocess so its peak RSS is measured on its own.
+Both modes classify every line of the file and keep the first
+UPLOAD_MAX_ITEMS matches, as filter_uploaded_menu does, so they do the same
+work. (The app stops reading once the cap is hit; this measures the worst
+case, a file that never reaches it.) "stream" feeds the file through the
+lazy line/item generators in chunks; "buffered" reads the whole file into
+one string and splits it into a list of lines first, which is what the
+pipeline used to do.
+
+Usage:
+    python bench_streaming.py            # 1, 10 and 100 MB
+    python bench_streaming.py 1 5 50     # custom sizes in MB
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SAMPLE_MENU = """Grilled Chicken Breast $16.99 - Marinated chicken with herbs
+Caesar Salad $12.99 - Romaine lettuce, parmesan, croutons
+Vegan Buddha Bowl $14.99 - Quinoa, roasted vegetables, tahini dressing
+Cheese Pizza $13.99 - Tomato sauce, mozzarella, fresh basil
+Vegetable Stir Fry $11.99 - Mixed vegetables with tofu
+Beef Burger $15.99 - Angus beef patty with cheese
+Our Story
+Open daily from 11am
+"""
+
+
+def write_menu(path: str, size_mb: int) -> None:
+    block = SAMPLE_MENU.encode("utf-8")
+    target = size_mb * 1024 * 1024
+    with open(path, "wb") as f:
+        written = 0
+        while written < target:
+            f.write(block)
+            written += len(block)
+
+
+def drain(matches, cap: int) -> tuple:
+    """Run the item pipeline to the end, keeping the first `cap` items; returns (kept, matched)"""
+    kept = []
+    matched = 0
+    for item in matches:
+        matched += 1
+        if len(kept) < cap:
+            kept.append(item)
+    return kept, matched
+
+
+def run_one(mode: str, path: str) -> None:
+    """Runs inside the subprocess: filter the file and report peak RSS"""
+    import menu_engine
+
+    started = time.perf_counter()
+    if mode == "stream":
+        with open(path, "rb") as f:
+            lines = menu_engine.iter_lines(menu_engine.iter_upload_text(f))
+            kept, count = drain(menu_engine.iter_keyword_items(lines, "vegan"), menu_engine.UPLOAD_MAX_ITEMS)
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        lines = text.split('\n')
+        kept, count = drain(menu_engine.iter_keyword_items(lines, "vegan"), menu_engine.UPLOAD_MAX_ITEMS)
+    elapsed = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    print(f"RESULT {peak_mb:.1f} {elapsed:.2f} {count} {len(kept)}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run_one(sys.argv[2], sys.argv[3])
+        return
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1, 10, 100]
+
+    print("=" * 60)
+    print("Keyword pipeline peak memory benchmark")
+    print("=" * 60)
+    print(f"{'Input':>8} {'Mode':>10} {'Peak RSS':>12} {'Time':>9} {'Matched':>10} {'Kept':>6}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes:
+            path = os.path.join(tmp, f"menu_{size_mb}mb.txt")
+            write_menu(path, size_mb)
+            for mode in ("stream", "buffered"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--run", mode, path],
+                    capture_output=True, text=True, check=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                ).stdout
+                line = next(l for l in output.splitlines() if l.startswith("RESULT"))
+                _, peak_mb, elapsed, count, kept = line.split()
+                print(f"{size_mb:>6}MB {mode:>10} {float(peak_mb):>9.1f} MB {float(elapsed):>8.2f}s {int(count):>10} {int(kept):>6}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
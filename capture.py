@@ -0,0 +1,217 @@
+"""
+Opt-in traffic capture and deterministic replay.
+
+With CAPTURE_ENABLED=true every filtering request is written to a gzipped
+JSON-lines log: its inputs, the page bytes we fetched, each LLM request and
+response, per-stage timings and the final items. replay.py reads that log
+back and re-runs each request against the current code, serving the
+network calls from the log instead of the network.
+
+The pipeline reports to whichever capture or replay is active in the
+current context, via record_exchange(), replayed_exchange() and stage().
+When neither is active these are no-ops.
+"""
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import requests
+
+from deadline import DeadlineExceeded
+
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "captures/traffic.jsonl.gz")
+# Uploads bigger than this are not captured
+CAPTURE_MAX_INPUT_BYTES = int(os.getenv("CAPTURE_MAX_INPUT_BYTES", str(5 * 1024 * 1024)))
+
+_active_capture: ContextVar[Optional["RequestCapture"]] = ContextVar("active_capture", default=None)
+_active_replay: ContextVar[Optional["ReplaySource"]] = ContextVar("active_replay", default=None)
+_write_lock = threading.Lock()
+
+
+class ReplayMiss(Exception):
+    """The code made a network call the captured request never made"""
+
+
+class RequestCapture:
+    def __init__(self, inputs: dict):
+        self.started = time.perf_counter()
+        self.record = {
+            "id": uuid.uuid4().hex,
+            "time": time.time(),
+            "inputs": inputs,
+            "exchanges": [],
+            "timings": {},
+            "result": None,
+        }
+
+    def add_timing(self, name: str, seconds: float) -> None:
+        timings = self.record["timings"]
+        timings[name] = round(timings.get(name, 0.0) + seconds, 6)
+
+    def set_result(self, items: list, error_message: Optional[str], degraded: bool) -> None:
+        self.record["result"] = {
+            "items": [item.to_dict() for item in items],
+            "error_message": error_message,
+            "degraded": degraded,
+        }
+
+
+class ReplayResponse:
+    """Stands in for requests.Response when a call is served from the log"""
+
+    def __init__(self, exchange: dict):
+        self.status_code = exchange["status"]
+        self.headers = exchange.get("headers", {})
+        self.content = base64.b64decode(exchange["body"])
+        self.text = self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error (replayed)", response=self)
+
+
+class ReplaySource:
+    def __init__(self, exchanges: list):
+        self.pending = {}
+        self.timings = {}
+        for exchange in exchanges:
+            self.pending.setdefault(exchange["kind"], []).append(exchange)
+
+    def add_timing(self, name: str, seconds: float) -> None:
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 6)
+
+    def next(self, kind: str) -> ReplayResponse:
+        queue = self.pending.get(kind)
+        if not queue:
+            raise ReplayMiss(f"no captured '{kind}' call left to replay")
+        exchange = queue.pop(0)
+        if exchange.get("error_type"):
+            raise replayed_error(exchange["error_type"], exchange["error"])
+        return ReplayResponse(exchange)
+
+
+def replayed_error(error_type: str, message: str) -> Exception:
+    """Rebuild a recorded exception with its original type and message"""
+    if error_type == DeadlineExceeded.__name__:
+        return DeadlineExceeded(message)
+    error_class = getattr(requests.exceptions, error_type, None)
+    if not (isinstance(error_class, type) and issubclass(error_class, requests.exceptions.RequestException)):
+        error_class = requests.exceptions.RequestException
+    return error_class(message)
+
+
+def write_record(record: dict, path: str = CAPTURE_PATH) -> None:
+    """Append one record to the log (each append is its own gzip member)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _write_lock:
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_records(path: str = CAPTURE_PATH):
+    """Yield captured records in order"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+@contextmanager
+def capturing(inputs: dict):
+    """Capture the request run inside this block; yields None when capture is off"""
+    if not CAPTURE_ENABLED or _active_replay.get() is not None:
+        yield None
+        return
+    capture = RequestCapture(inputs)
+    token = _active_capture.set(capture)
+    try:
+        yield capture
+    finally:
+        _active_capture.reset(token)
+        capture.add_timing("total", time.perf_counter() - capture.started)
+        try:
+            write_record(capture.record)
+        except OSError as e:
+            print(f"⚠️  Could not write capture record: {e}")
+
+
+@contextmanager
+def replaying(record: dict):
+    """Serve network calls made inside this block from a captured record; yields the ReplaySource"""
+    source = ReplaySource(record["exchanges"])
+    token = _active_replay.set(source)
+    try:
+        yield source
+    finally:
+        _active_replay.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into the active capture (or replay)"""
+    target = _active_capture.get() or _active_replay.get()
+    if target is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        target.add_timing(name, time.perf_counter() - started)
+
+
+def record_exchange(kind: str, request: dict, status: int, body: bytes, headers: Optional[dict] = None) -> None:
+    """Log one network call (kind is "fetch" or "llm") into the active capture"""
+    capture = _active_capture.get()
+    if capture is None:
+        return
+    capture.record["exchanges"].append({
+        "kind": kind,
+        "request": request,
+        "status": status,
+        "headers": headers or {},
+        "body": base64.b64encode(body).decode("ascii"),
+    })
+
+
+def record_failure(kind: str, request: dict, error: Exception) -> None:
+    """
+    Log a network call that raised instead of returning a response. The
+    exception's class name and message are kept so replay raises the same.
+    """
+    capture = _active_capture.get()
+    if capture is None:
+        return
+    capture.record["exchanges"].append({
+        "kind": kind,
+        "request": request,
+        "error_type": type(error).__name__,
+        "error": str(error),
+    })
+
+
+def replay_active() -> bool:
+    """True while network calls are being served from a captured record"""
+    return _active_replay.get() is not None
+
+
+def replayed_exchange(kind: str) -> Optional[ReplayResponse]:
+    """The next captured response of this kind when replaying, otherwise None"""
+    replay = _active_replay.get()
+    if replay is None:
+        return None
+    return replay.next(kind)
@@ -0,0 +1,63 @@
+"""
+Per-request deadline shared by the fetch, parse and LLM stages.
+
+A Deadline is created when a request arrives and passed down the pipeline.
+Each stage asks it for a timeout (its own cap, limited by what is left of
+the budget). When a stage gives up early because the budget ran out, it
+marks the deadline as degraded so the response can say so.
+"""
+import os
+import time
+from typing import Optional
+
+# Total time a request may spend before we fall back to keywords
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "20"))
+# Don't start an LLM call with less than this much budget left
+LLM_MIN_BUDGET = float(os.getenv("LLM_MIN_BUDGET", "3"))
+
+
+def split_timeout(budget: float, connect_cap: float) -> tuple:
+    """
+    Split a stage budget into requests' (connect, read) timeouts. requests
+    applies each one separately, so together they must fit in the budget.
+    """
+    connect = min(connect_cap, budget / 2)
+    return connect, budget - connect
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no budget left to run"""
+
+
+class Deadline:
+    def __init__(self, budget: float = REQUEST_DEADLINE):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.degraded = False
+        self.degraded_reason: Optional[str] = None
+        # LLM requests actually sent for this request, retries included
+        self.llm_calls = 0
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float, reserve: float = 0.0) -> float:
+        """
+        Timeout for the next stage: at most `cap`, never more than the budget
+        left after holding back `reserve` seconds for later stages.
+        """
+        available = self.remaining() - reserve
+        if available <= 0:
+            available = self.remaining()
+        if available <= 0:
+            raise DeadlineExceeded(f"request deadline of {self.budget:g}s exceeded")
+        return min(cap, available)
+
+    def mark_degraded(self, reason: str) -> None:
+        if not self.degraded:
+            print(f"⏱️  Result degraded: {reason}")
+        self.degraded = True
+        self.degraded_reason = self.degraded_reason or reason
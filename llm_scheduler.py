@@ -0,0 +1,227 @@
+"""
+Client-side rate limiting for outbound OpenAI calls.
+
+Two token buckets track our quota: one for requests per minute and one for
+tokens per minute. Each call estimates its prompt + completion tokens up
+front and waits until both buckets can cover it. Interactive calls (a user
+waiting on a page) always go ahead of batch calls (pre-warming, CLI runs).
+
+429s and transient 5xx responses are retried with jittered exponential
+backoff, honouring Retry-After when the API sends it. A 429 also pauses
+every caller, since the whole quota is shared.
+"""
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+
+import capture
+from deadline import Deadline, DeadlineExceeded, split_timeout
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "30000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Most of an LLM call's timeout that connecting may use; the rest is for the response
+LLM_CONNECT_TIMEOUT = 5
+
+# Priorities - lower goes first
+INTERACTIVE = 0
+BATCH = 1
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(prompt: str, max_tokens: int = 0) -> int:
+    """
+    Rough token count for a request: ~4 characters per prompt token, plus the
+    completion allowance, which OpenAI also counts against the TPM limit.
+    """
+    return len(prompt) // 4 + 8 + max_tokens
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` per minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 1))
+        self.refill_rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Read the server's requested delay from Retry-After / retry-after-ms"""
+    retry_ms = response.headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class LLMScheduler:
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting_interactive = 0
+
+    def acquire(self, tokens: int, priority: int = INTERACTIVE, deadline: Optional[Deadline] = None) -> bool:
+        """
+        Block until the quota covers one request of `tokens` tokens.
+        Returns False if that can't happen before the deadline.
+        """
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._waiting_interactive += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(
+                        self.paused_until - now,
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                    )
+                    if priority == BATCH and self._waiting_interactive:
+                        # Let interactive callers drain first
+                        wait = max(wait, 0.05)
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return True
+                    if deadline is not None and wait >= deadline.remaining():
+                        return False
+                    self._cond.wait(wait)
+            finally:
+                if priority == INTERACTIVE:
+                    self._waiting_interactive -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (after the API says we're over quota)"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def settle(self, estimated: int, response: requests.Response) -> None:
+        """Give back tokens we reserved but the API says we didn't use"""
+        try:
+            used = response.json()["usage"]["total_tokens"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if used < estimated:
+            with self._cond:
+                self.tokens.refund(estimated - used)
+                self._cond.notify_all()
+
+    def post_chat_completion(
+        self,
+        url: str,
+        headers: dict,
+        data: dict,
+        priority: int = INTERACTIVE,
+        deadline: Optional[Deadline] = None,
+        timeout: float = 30,
+    ) -> requests.Response:
+        """
+        POST a chat completion within our rate limits, retrying 429/5xx.
+        Returns the last response; raises DeadlineExceeded if the deadline
+        runs out while waiting for quota.
+        When replaying captured traffic the calls never reach the API, so the
+        quota, pauses and backoff sleeps are skipped to keep replay fast and
+        deterministic.
+        """
+        replaying = capture.replay_active()
+        prompt = "".join(message.get("content", "") for message in data.get("messages", []))
+        estimated = estimate_tokens(prompt, data.get("max_tokens", 0))
+
+        attempt = 0
+        while True:
+            if not replaying and not self.acquire(estimated, priority, deadline):
+                raise DeadlineExceeded("no rate limit capacity before the request deadline")
+
+            if deadline is not None:
+                # Connect + response must both fit in what the deadline has left
+                call_timeout = split_timeout(deadline.timeout(timeout), LLM_CONNECT_TIMEOUT)
+            else:
+                call_timeout = timeout
+            with capture.stage("llm"):
+                response = capture.replayed_exchange("llm")
+                if response is None:
+                    if deadline is not None:
+                        deadline.llm_calls += 1
+                    try:
+                        response = requests.post(url, headers=headers, json=data, timeout=call_timeout)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                        capture.record_failure("llm", data, e)
+                        raise
+                    capture.record_exchange("llm", data, response.status_code, response.content, {
+                        name: response.headers[name]
+                        for name in ("retry-after", "retry-after-ms")
+                        if name in response.headers
+                    })
+
+            if response.status_code == 200:
+                if not replaying:
+                    self.settle(estimated, response)
+                return response
+            if response.status_code not in RETRY_STATUSES or attempt >= LLM_MAX_RETRIES:
+                return response
+            if replaying:
+                attempt += 1
+                continue
+
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if response.status_code == 429:
+                self.pause(delay)
+            if deadline is not None and delay >= deadline.remaining():
+                print(f"⏱️  LLM returned {response.status_code}, no time left to retry")
+                return response
+
+            attempt += 1
+            print(f"🔁 LLM returned {response.status_code}, retry {attempt}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+# Shared by every caller in the process so they draw on one quota
+LLM_SCHEDULER = LLMScheduler()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Small local text classifier trained from accumulated LLM labels.
+
+Every LLM filtering call can log the lines it returned together with the
+filter it was asked for. This module turns that log into a hashed n-gram
+averaged perceptron that classifies a menu line offline in well under a
+millisecond.
+
+Usage:
+    python local_classifier.py train [--labels llm_labels.jsonl] [--model local_classifier.json]
+    python local_classifier.py predict "Vegetable Stir Fry $11.99 - Mixed vegetables with tofu"
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LLM_LABELS = os.getenv("LOG_LLM_LABELS", "false").lower() == "true"
+LABEL_LOG_PATH = os.getenv("LABEL_LOG_PATH", "llm_labels.jsonl")
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "local_classifier.json")
+# Score gap between the top two labels below which a prediction isn't trusted
+LOCAL_CONFIDENCE_MARGIN = float(os.getenv("LOCAL_CONFIDENCE_MARGIN", "1.0"))
+
+# Labels in order of strictness - a vegan item is also vegetarian
+LABELS = ("vegan", "vegetarian", "nonvegetarian")
+
+N_FEATURES = 2 ** 18
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+_log_lock = threading.Lock()
+
+
+def strictest_label(labels) -> Optional[str]:
+    """The strictest known label among `labels` (vegan beats vegetarian), or None"""
+    return next((label for label in LABELS if label in labels), None)
+
+
+def log_labels(examples: list, path: Optional[str] = None) -> None:
+    """Append (line, label) pairs produced by the LLM to the label log, skipping unknown labels"""
+    examples = [(line, label) for line, label in examples if line and label in LABELS]
+    if not examples:
+        return
+    with _log_lock:
+        with open(path or LABEL_LOG_PATH, "a", encoding="utf-8") as f:
+            for line, label in examples:
+                f.write(json.dumps({"line": line, "label": label}) + "\n")
+
+
+def load_examples(path: str) -> list:
+    """
+    Read the label log into (line, label) examples.
+
+    The same line can be returned for several filters (a vegan dish also shows
+    up in the vegetarian list), so each line keeps its strictest label.
+    """
+    best = {}
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            record = json.loads(raw)
+            line, label = record.get("line"), record.get("label")
+            if not line or label not in LABELS:
+                continue
+            best[line] = strictest_label((label, best.get(line)))
+    return list(best.items())
+
+
+def hashed_features(text: str) -> dict:
+    """Map text to hashed word unigram, word bigram and character trigram counts"""
+    words = TOKEN_PATTERN.findall(text.lower())
+    grams = list(words)
+    grams.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"<{word}>"
+        grams.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+
+    features = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % N_FEATURES
+        features[index] = features.get(index, 0) + 1
+    return features
+
+
+class LocalClassifier:
+    """Multi-class averaged perceptron over hashed n-gram features"""
+
+    def __init__(self, weights: Optional[dict] = None):
+        # label -> {feature index -> weight}; a bias lives at index -1
+        self.weights = weights or {label: {} for label in LABELS}
+
+    def scores(self, features: dict) -> dict:
+        result = {}
+        for label, weights in self.weights.items():
+            score = weights.get(-1, 0.0)
+            for index, count in features.items():
+                score += weights.get(index, 0.0) * count
+            result[label] = score
+        return result
+
+    def predict(self, text: str) -> str:
+        scores = self.scores(hashed_features(text))
+        return max(LABELS, key=lambda label: scores[label])
+
+    def classify(self, item_text: str) -> dict:
+        """Classify a menu item, returning the same shape as classify_menu_item_keywords"""
+        scores = self.scores(hashed_features(item_text))
+        ranked = sorted(LABELS, key=lambda label: scores[label], reverse=True)
+        label = ranked[0]
+        return {
+            "is_vegan": label == "vegan",
+            "is_vegetarian": label in ("vegan", "vegetarian"),
+            "reason": f"classified {label} by local model",
+            "confident": scores[ranked[0]] - scores[ranked[1]] >= LOCAL_CONFIDENCE_MARGIN,
+        }
+
+    def train(self, examples: list, epochs: int = 10) -> None:
+        """Fit weights with the averaged perceptron update"""
+        weights = {label: {} for label in LABELS}
+        totals = {label: {} for label in LABELS}
+        stamps = {label: {} for label in LABELS}
+        step = 0
+
+        def update(label, index, delta):
+            # Lazily accumulate the running sum for weight averaging
+            totals[label][index] = totals[label].get(index, 0.0) + (step - stamps[label].get(index, 0)) * weights[label].get(index, 0.0)
+            stamps[label][index] = step
+            weights[label][index] = weights[label].get(index, 0.0) + delta
+
+        featurized = [(line, hashed_features(line), label) for line, label in examples]
+        self.weights = weights
+        for epoch in range(epochs):
+            # Deterministic shuffle so training is reproducible
+            featurized.sort(key=lambda example: zlib.crc32(f"{epoch}:{example[0]}".encode("utf-8")))
+            for _, features, label in featurized:
+                step += 1
+                scores = self.scores(features)
+                guess = max(LABELS, key=lambda candidate: scores[candidate])
+                if guess == label:
+                    continue
+                for index, count in list(features.items()) + [(-1, 1)]:
+                    update(label, index, count)
+                    update(guess, index, -count)
+
+        averaged = {}
+        for label in LABELS:
+            averaged[label] = {}
+            for index, weight in weights[label].items():
+                total = totals[label].get(index, 0.0) + (step - stamps[label].get(index, 0)) * weight
+                if total:
+                    averaged[label][index] = total / max(step, 1)
+        self.weights = averaged
+
+    def save(self, path: str) -> None:
+        payload = {
+            "n_features": N_FEATURES,
+            "weights": {label: {str(k): v for k, v in w.items()} for label, w in self.weights.items()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("n_features") != N_FEATURES:
+            raise ValueError(f"Model {path} was trained with a different feature size")
+        weights = {label: {int(k): v for k, v in w.items()} for label, w in payload["weights"].items()}
+        return cls(weights)
+
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def load_local_classifier() -> Optional[LocalClassifier]:
+    """Return the trained model, reloading it if the file changed; None if there is none"""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(LOCAL_MODEL_PATH)
+    except OSError:
+        return None
+    with _model_lock:
+        if _model is None or mtime != _model_mtime:
+            try:
+                _model = LocalClassifier.load(LOCAL_MODEL_PATH)
+                _model_mtime = mtime
+                print(f"🧮 Loaded local classifier from {LOCAL_MODEL_PATH}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  Could not load local classifier: {e}")
+                return None
+        return _model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or query the local menu item classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Fit a model from the LLM label log")
+    train_parser.add_argument("--labels", default=LABEL_LOG_PATH)
+    train_parser.add_argument("--model", default=LOCAL_MODEL_PATH)
+    train_parser.add_argument("--epochs", type=int, default=10)
+
+    predict_parser = subparsers.add_parser("predict", help="Classify a single menu line")
+    predict_parser.add_argument("text")
+    predict_parser.add_argument("--model", default=LOCAL_MODEL_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        examples = load_examples(args.labels)
+        if not examples:
+            print(f"❌ No labelled examples found in {args.labels}")
+            raise SystemExit(1)
+        counts = {label: sum(1 for _, l in examples if l == label) for label in LABELS}
+        print(f"📚 Training on {len(examples)} examples: {counts}")
+        model = LocalClassifier()
+        model.train(examples, epochs=args.epochs)
+        correct = sum(1 for line, label in examples if model.predict(line) == label)
+        print(f"✅ Training accuracy: {correct / len(examples):.1%}")
+        model.save(args.model)
+        print(f"💾 Saved model to {args.model}")
+    else:
+        model = LocalClassifier.load(args.model)
+        print(model.classify(args.text))
+
+
+if __name__ == "__main__":
+    main()
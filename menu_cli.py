@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Batch menu filtering from the command line, on the shared engine.
+
+Each input is a restaurant URL, a path to a menu text file, or "-" for
+stdin. Results are written as JSON lines, one per input. LLM calls use
+batch priority, so a CLI run never gets ahead of users on the web app
+when both share a quota.
+
+Usage:
+    python menu_cli.py --filter vegan https://example.com/menu menus/*.txt
+    python menu_cli.py --backend hybrid --workers 4 --output results.jsonl urls.txt --url-list
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import menu_engine
+from deadline import Deadline
+from llm_scheduler import BATCH
+
+FILTER_TYPES = ("all", "vegan", "vegetarian", "nonvegetarian")
+
+
+def build_inputs(source: str, filter_type: str, backend: str) -> tuple:
+    """Turn a CLI argument into engine inputs; returns (inputs, upload)"""
+    inputs = {"filter_type": filter_type, "backend": backend}
+    if source.startswith(("http://", "https://")):
+        return {**inputs, "input_type": "url", "menu_url": source}, None
+    if source == "-":
+        return {**inputs, "input_type": "text", "menu_text": sys.stdin.read()}, None
+    # Files are streamed like uploads so huge menus don't have to fit in memory
+    fileobj = open(source, "rb")
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return {**inputs, "input_type": "upload"}, (fileobj, size)
+
+
+def run_one(source: str, filter_type: str, backend: str, deadline_seconds: float) -> dict:
+    deadline = Deadline(deadline_seconds)
+    try:
+        inputs, upload = build_inputs(source, filter_type, backend)
+    except OSError as e:
+        return {"source": source, "filter_type": filter_type, "backend": backend,
+                "error": str(e), "degraded": False, "items": []}
+
+    try:
+        items, error_message = menu_engine.run_captured_request(inputs, deadline, upload, priority=BATCH)
+    finally:
+        if upload is not None:
+            upload[0].close()
+
+    return {
+        "source": source,
+        "filter_type": filter_type,
+        "backend": backend,
+        "error": error_message,
+        "degraded": deadline.degraded,
+        "items": [item.to_dict() for item in items],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter restaurant menus in bulk")
+    parser.add_argument("sources", nargs="+", help="URLs, menu text files, or - for stdin")
+    parser.add_argument("--filter", dest="filter_type", choices=FILTER_TYPES, default="all")
+    parser.add_argument("--backend", choices=sorted(menu_engine.BACKENDS), default=menu_engine.FILTER_BACKEND)
+    parser.add_argument("--url-list", action="store_true", help="Treat each file argument as a list of URLs, one per line")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--deadline", type=float, default=120, help="Seconds allowed per input")
+    parser.add_argument("--output", default="-", help="JSON lines output file (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Show the engine's debug output")
+    args = parser.parse_args()
+
+    sources = args.sources
+    if args.url_list:
+        sources = []
+        for path in args.sources:
+            with open(path, encoding="utf-8") as f:
+                sources.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    # Results go to the real stdout; the engine's debug prints are dropped unless --verbose
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        try:
+            with quiet, ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+                results = pool.map(
+                    lambda source: run_one(source, args.filter_type, args.backend, args.deadline),
+                    sources,
+                )
+                for result in results:
+                    if result["error"]:
+                        failed += 1
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    print(f"✅ Filtered {len(sources) - failed}/{len(sources)} menus", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,774 @@
+"""
+Shared menu filtering engine.
+
+Everything between "here is a menu" and "here are the matching items" lives
+here: fetching and extracting page text, the keyword / local / LLM / hybrid
+classifier backends, and parsing their output into MenuItems. app.py,
+app_simple.py and menu_cli.py are thin layers on top, so caching, deadlines,
+rate limiting and capture apply to every way the service is run.
+
+Each pipeline entry point has a blocking version and an async one (prefixed
+with "a") that runs it in a worker thread.
+"""
+import asyncio
+import base64
+import codecs
+import hashlib
+import itertools
+import os
+import re
+import socket
+import threading
+import time
+from typing import Optional
+
+import requests
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+
+import capture
+from deadline import Deadline, DeadlineExceeded, LLM_MIN_BUDGET, split_timeout
+from llm_scheduler import INTERACTIVE, LLM_SCHEDULER
+from local_classifier import LOG_LLM_LABELS, load_local_classifier, log_labels, strictest_label
+from menu_items import JSON_FORMAT_INSTRUCTIONS, MenuItem, labels_for, parse_llm_items, split_price
+
+# Load environment variables
+load_dotenv()
+
+# Store OpenAI API key
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Configuration
+USE_LLM = os.getenv("USE_LLM", "false").lower() == "true"
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+# Ask the LLM for compact JSON items instead of free-form lines
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Per-item classifier used when the LLM is off or unavailable: "keywords" or "local"
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "keywords").lower()
+# Backend used for whole menus: "keywords", "local", "llm" or "hybrid".
+# Defaults to "llm" when USE_LLM is set, otherwise to CLASSIFIER_BACKEND.
+FILTER_BACKEND = os.getenv("FILTER_BACKEND", "llm" if USE_LLM else CLASSIFIER_BACKEND).lower()
+
+# Per-stage timeout caps; each stage also gets no more than the request deadline has left
+FETCH_TIMEOUT = 15
+# Most of a fetch's budget that connecting may use; the rest is left for reading
+FETCH_CONNECT_TIMEOUT = 5
+LLM_TIMEOUT = 30
+
+# Uploaded menu files are read in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Uploads larger than this skip the LLM and are streamed through keyword filtering
+UPLOAD_LLM_MAX_BYTES = int(os.getenv("UPLOAD_LLM_MAX_BYTES", "200000"))
+# Streamed uploads stop after this many matching items, so the result (and the
+# cache entry holding it) stays bounded however large the file is
+UPLOAD_MAX_ITEMS = int(os.getenv("UPLOAD_MAX_ITEMS", "5000"))
+# The hybrid backend only decides items locally when at least this share of the
+# menu's non-empty lines are price-bearing item lines
+HYBRID_MIN_COVERAGE = float(os.getenv("HYBRID_MIN_COVERAGE", "0.5"))
+
+# Keywords that indicate vegan items
+VEGAN_KEYWORDS = [
+    'vegan', 'plant-based', 'plant based', 'no dairy', 'no eggs',
+    'dairy-free', 'dairy free', 'egg-free', 'egg free'
+]
+
+# Keywords that indicate vegetarian items
+VEGETARIAN_KEYWORDS = [
+    'vegetarian', 'veggie', 'no meat', 'meat-free', 'meat free'
+]
+
+# Keywords that indicate non-vegan items (things to avoid for vegan filter)
+NON_VEGAN_KEYWORDS = [
+    'beef', 'pork', 'chicken', 'turkey', 'lamb', 'fish', 'seafood',
+    'salmon', 'tuna', 'shrimp', 'crab', 'lobster', 'scallops', 'clams',
+    'meat', 'bacon', 'sausage', 'ham', 'steak', 'burger', 'cheese',
+    'milk', 'butter', 'cream', 'egg', 'eggs', 'yogurt', 'yoghurt'
+]
+
+
+def classify_menu_item_keywords(item_text: str) -> dict:
+    """
+    Classify menu item using keyword matching (fallback method)
+    """
+    item_lower = item_text.lower()
+
+    # Check for explicit labels
+    is_vegan = any(keyword in item_lower for keyword in VEGAN_KEYWORDS)
+    is_vegetarian = any(keyword in item_lower for keyword in VEGAN_KEYWORDS + VEGETARIAN_KEYWORDS)
+
+    # Check for non-vegan ingredients
+    has_non_vegan = any(keyword in item_lower for keyword in NON_VEGAN_KEYWORDS)
+
+    # If explicitly labeled, trust the label
+    if is_vegan:
+        return {"is_vegan": True, "is_vegetarian": True, "reason": "explicitly labeled vegan", "confident": True}
+    elif is_vegetarian:
+        return {"is_vegan": False, "is_vegetarian": True, "reason": "explicitly labeled vegetarian", "confident": True}
+
+    # If no non-vegan keywords found, assume vegan (conservative)
+    # This is a guess from missing keywords, so it isn't marked confident
+    if not has_non_vegan:
+        return {"is_vegan": True, "is_vegetarian": True, "reason": "no animal products detected", "confident": False}
+
+    # Check for meat specifically for vegetarian classification
+    meat_keywords = ['beef', 'pork', 'chicken', 'turkey', 'lamb', 'fish', 'seafood', 'meat', 'bacon', 'sausage', 'ham', 'steak']
+    has_meat = any(keyword in item_lower for keyword in meat_keywords)
+
+    if not has_meat:
+        return {"is_vegan": False, "is_vegetarian": True, "reason": "no meat detected, may contain dairy/eggs", "confident": True}
+    else:
+        return {"is_vegan": False, "is_vegetarian": False, "reason": "contains meat", "confident": True}
+
+def get_item_classifier() -> tuple:
+    """
+    Pick the per-item classifier used by the keyword path and LLM fallbacks.
+    Returns (classify function, label shown in reasons).
+    """
+    if CLASSIFIER_BACKEND == "local":
+        return LocalBackend().classifier()
+    return classify_menu_item_keywords, "Keywords"
+
+def abort_response(response) -> None:
+    """Shut down a streamed response's socket, waking a read blocked in another thread"""
+    raw = getattr(response, "raw", None)
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    if sock is None:
+        # http.client drops the connection's socket for close-delimited bodies;
+        # the response's file object still holds it
+        sock = getattr(getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def extract_menu_text(url: str, deadline: Optional[Deadline] = None, reserve: float = 0.0) -> str:
+    """
+    Extract raw text content from a webpage - no processing.
+    `reserve` seconds of the deadline are held back for later stages.
+    """
+    try:
+        if deadline is not None:
+            timeout = deadline.timeout(FETCH_TIMEOUT, reserve=reserve)
+        else:
+            timeout = FETCH_TIMEOUT
+
+        # Add headers to appear more like a real browser
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        }
+
+        # requests' timeouts apply to each connect and each read separately, so
+        # connect + headers share the budget and a watchdog aborts the body
+        # read when the rest of it runs out (a server trickling bytes never
+        # trips a per-read timeout)
+        fetch_started = time.monotonic()
+        with capture.stage("fetch"):
+            replayed = capture.replayed_exchange("fetch")
+            if replayed is not None:
+                replayed.raise_for_status()
+                content = replayed.content
+            else:
+                try:
+                    with requests.get(url, headers=headers, timeout=split_timeout(timeout, FETCH_CONNECT_TIMEOUT),
+                                      allow_redirects=True, stream=True) as response:
+                        response.raise_for_status()
+                        out_of_time = DeadlineExceeded(f"fetch did not finish within {timeout:.1f}s")
+                        left = timeout - (time.monotonic() - fetch_started)
+                        if left <= 0:
+                            raise out_of_time
+                        expired = threading.Event()
+
+                        def expire():
+                            expired.set()
+                            abort_response(response)
+
+                        watchdog = threading.Timer(left, expire)
+                        watchdog.daemon = True
+                        watchdog.start()
+                        chunks = []
+                        try:
+                            for chunk in response.iter_content(chunk_size=65536):
+                                chunks.append(chunk)
+                                if time.monotonic() - fetch_started > timeout:
+                                    raise out_of_time
+                        except requests.exceptions.RequestException as e:
+                            if expired.is_set():
+                                raise out_of_time from e
+                            raise
+                        finally:
+                            watchdog.cancel()
+                        if expired.is_set():
+                            # The watchdog may have cut a close-delimited body short
+                            raise out_of_time
+                        content = b"".join(chunks)
+                except (requests.exceptions.RequestException, DeadlineExceeded) as e:
+                    # Kept with its type and message so replay reports the same error
+                    capture.record_failure("fetch", {"url": url}, e)
+                    raise
+                capture.record_exchange("fetch", {"url": url}, response.status_code, content)
+
+        with capture.stage("parse"):
+            # Get raw text without any processing
+            soup = BeautifulSoup(content, 'html5lib')
+
+            # Remove only script and style tags to get clean text
+            for script in soup(["script", "style"]):
+                script.decompose()
+
+            # Get all text - let LLM handle the filtering
+            raw_text = soup.get_text(separator='\n', strip=True)
+        
+        print(f"📄 Extracted {len(raw_text)} characters of raw text from URL")
+        return raw_text
+
+    except requests.exceptions.RequestException as e:
+        return f"Error fetching menu: Network error - {str(e)}"
+    except DeadlineExceeded as e:
+        return f"Error fetching menu: Timed out - {str(e)}"
+    except Exception as e:
+        return f"Error fetching menu: {str(e)}"
+
+def filter_menu_items(menu_text: str, filter_type: str, deadline: Optional[Deadline] = None,
+                      priority: int = INTERACTIVE, backend: Optional[str] = None) -> list:
+    """
+    Filter menu items with the given backend (FILTER_BACKEND by default) and
+    return only matching items.
+    If a deadline is given and runs short, the keyword path is used and the
+    deadline is marked degraded. `priority` orders LLM calls (see llm_scheduler).
+    """
+    engine_backend = get_backend(backend)
+    print(f"\n{'='*60}")
+    print(f"🤖 filter_menu_items called")
+    print(f"{'='*60}")
+    print(f"Menu text length: {len(menu_text)} characters")
+    print(f"Filter type: {filter_type}")
+    print(f"Backend: {engine_backend.name}")
+    print(f"Menu text content (first 500 chars):\n{menu_text[:500]}")
+    print(f"{'='*60}\n")
+
+    try:
+        result = engine_backend.filter(menu_text, filter_type, deadline, priority)
+        print(f"🔵 {engine_backend.name} backend returned: {type(result)}, length: {len(result) if result else 'None'}")
+
+        # Ensure we always return a list
+        if result is None:
+            print("⚠️  Function returned None, using empty list")
+            return []
+        if not isinstance(result, list):
+            print(f"⚠️  Function returned {type(result)} instead of list, converting to empty list")
+            return []
+        
+        print(f"✅ filter_menu_items returning {len(result)} items")
+        return result
+    except Exception as e:
+        print(f"❌ filter_menu_items failed: {e}")
+        import traceback
+        print(f"🐛 Full traceback: {traceback.format_exc()}")
+        # Ultimate fallback - return empty list
+        return []
+
+def llm_fallback(menu_text: str, filter_type: str, deadline: Optional[Deadline], reason: str) -> list:
+    """Fall back to keyword filtering after the LLM path failed, flagging the result as degraded"""
+    if deadline is not None:
+        deadline.mark_degraded(f"{reason}, so keyword matching was used")
+    print(f"🔄 Falling back to keyword filtering for {filter_type}: {reason}")
+    result = filter_menu_with_keywords(menu_text, filter_type)
+    print(f"📝 Keyword filtering returned {len(result) if result else 0} items")
+    return result if result else []
+
+def llm_timeout(deadline: Optional[Deadline]) -> Optional[float]:
+    """Timeout for an LLM call, or None if there isn't enough budget left to make one"""
+    if deadline is None:
+        return LLM_TIMEOUT
+    if deadline.remaining() < LLM_MIN_BUDGET:
+        return None
+    return deadline.timeout(LLM_TIMEOUT)
+
+def log_llm_labels(items: list) -> None:
+    """
+    Log LLM-returned items for training the local classifier, each under the
+    strictest label the LLM gave it (a vegan dish from the vegetarian filter
+    is logged as vegan). Items without a known label are skipped.
+    """
+    if LOG_LLM_LABELS:
+        log_labels([(item.name, strictest_label(item.labels)) for item in items])
+
+def build_llm_prompt(task: str, menu_text: str, heading: str = "Menu Text") -> str:
+    """Wrap a task description and the menu in the output format we want back"""
+    if LLM_STRUCTURED_OUTPUT:
+        return f"""{task}
+
+{JSON_FORMAT_INSTRUCTIONS}
+
+{heading}:
+{menu_text}"""
+    return f"""{task}
+
+List each item on a new line. Include the price if visible.
+
+{heading}:
+{menu_text}
+
+Your response (just list the items, one per line):"""
+
+def build_llm_request(prompt: str) -> dict:
+    """Request body for a chat completion call"""
+    data = {
+        "model": LLM_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": 2000  # Enough for long item lists
+    }
+    if LLM_STRUCTURED_OUTPUT:
+        data["response_format"] = {"type": "json_object"}
+    return data
+
+# Task given to the LLM for each filter, with the label it implies for returned items
+LLM_FILTER_TASKS = {
+    'vegetarian': "Look at this restaurant menu text and list ONLY the vegetarian dishes (no meat/fish/seafood).",
+    'vegan': "Look at this restaurant menu text and list ONLY the vegan dishes (no animal products).",
+    'nonvegetarian': "Look at this restaurant menu text and list ONLY the dishes with meat, fish, or seafood.",
+}
+
+def filter_menu_with_llm(menu_text: str, filter_type: str, deadline: Optional[Deadline] = None,
+                         priority: int = INTERACTIVE) -> list:
+    """
+    Use LLM to analyze entire menu and extract only items matching the filter criteria
+    """
+    print(f"🔵 Entered filter_menu_with_llm with filter_type={filter_type}")
+    print(f"🧠 Sending menu to LLM for {filter_type} filtering...")
+
+    if not OPENAI_API_KEY:
+        print("⚠️  No OpenAI API key, falling back to keyword filtering")
+        result = filter_menu_with_keywords(menu_text, filter_type)
+        print(f"🔙 Keyword filtering returned {len(result) if result else 0} items")
+        return result if result else []
+
+    # Debug: Show menu preview
+    menu_preview = menu_text[:200] + "..." if len(menu_text) > 200 else menu_text
+    print(f"📄 Menu preview: {menu_preview.replace(chr(10), ' | ')}")
+    print(f"📏 Full menu text length: {len(menu_text)} characters")
+
+    if filter_type == 'all':
+        # For "all items", we want to extract all menu items without filtering
+        print("🔄 Calling extract_all_menu_items_llm for 'all' filter")
+        return extract_all_menu_items_llm(menu_text, deadline, priority)
+
+    task = LLM_FILTER_TASKS.get(filter_type)
+    if task is None:
+        print(f"⚠️  Unknown filter_type: {filter_type}, using keyword filtering")
+        result = filter_menu_with_keywords(menu_text, filter_type)
+        return result if result else []
+
+    # The filter itself tells us the label of items the LLM doesn't label
+    return run_llm_task(menu_text, filter_type, task, f"{filter_type} (LLM)", (filter_type,), deadline, priority)
+
+def extract_all_menu_items_llm(menu_text: str, deadline: Optional[Deadline] = None,
+                               priority: int = INTERACTIVE) -> list:
+    """
+    Use LLM to extract ALL menu items without filtering
+    """
+    print("🔵 Entered extract_all_menu_items_llm")
+
+    if not OPENAI_API_KEY:
+        print("⚠️  No OpenAI API key, falling back to keyword extraction")
+        result = filter_menu_with_keywords(menu_text, 'all')
+        print(f"🔙 Keyword extraction returned {len(result) if result else 0} items")
+        return result if result else []
+
+    return run_llm_task(menu_text, 'all', "Look at this restaurant menu/webpage text and list ALL the food dishes you find.",
+                        "all items (LLM)", (), deadline, priority, heading="Text")
+
+def run_llm_task(menu_text: str, filter_type: str, task: str, reason: str, labels: tuple,
+                 deadline: Optional[Deadline] = None, priority: int = INTERACTIVE,
+                 heading: str = "Menu Text") -> list:
+    """
+    Send one menu task to the LLM and parse the items it returns.
+    Items get `reason`, and `labels` unless the LLM labels them itself. Any
+    failure (no budget, API error, bad response) falls back to keyword
+    filtering for `filter_type` and marks the deadline degraded.
+    """
+    timeout = llm_timeout(deadline)
+    if timeout is None:
+        return llm_fallback(menu_text, filter_type, deadline, "request deadline reached before LLM call")
+
+    prompt = build_llm_prompt(task, menu_text, heading=heading)
+    print(f"✅ Created prompt of {len(prompt)} characters")
+    print(f"📋 Prompt preview (first 500 chars):\n{prompt[:500]}...")
+
+    try:
+        # Make direct API call to OpenAI
+        url = "https://api.openai.com/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        data = build_llm_request(prompt)
+
+        print(f"🔗 Calling OpenAI API for {filter_type} items...")
+        print(f"   Model: {LLM_MODEL}")
+        print(f"   API Key: {OPENAI_API_KEY[:10]}...{OPENAI_API_KEY[-4:] if OPENAI_API_KEY and len(OPENAI_API_KEY) > 14 else 'INVALID'}")
+        print(f"   Endpoint: {url}")
+        print(f"   Prompt length: {len(prompt)} characters")
+        print(f"   Timeout: {timeout:.1f}s")
+
+        response = LLM_SCHEDULER.post_chat_completion(url, headers, data, priority=priority,
+                                                      deadline=deadline, timeout=LLM_TIMEOUT)
+
+        print(f"📊 Response status: {response.status_code}")
+
+        if response.status_code != 200:
+            print(f"❌ API Error Response:")
+            print(response.text)
+            return llm_fallback(menu_text, filter_type, deadline, f"LLM API returned {response.status_code}")
+
+        response.raise_for_status()
+        print(f"✅ API call successful!")
+
+        result = response.json()
+        result_text = result["choices"][0]["message"]["content"].strip()
+
+        print(f"\n{'='*60}")
+        print(f"📨 RAW LLM OUTPUT ({len(result_text)} characters):")
+        print(f"{'='*60}")
+        print(result_text)
+        print(f"{'='*60}\n")
+
+        items = parse_llm_items(result_text, reason, labels=labels, structured=LLM_STRUCTURED_OUTPUT)
+
+        print(f"✅ LLM returned {len(items)} {filter_type} items after conversion")
+        log_llm_labels(items)
+        # Debug: Show first few results
+        if items:
+            print(f"📋 Sample results: {items[:3]}")
+        else:
+            print(f"⚠️  No items after conversion - LLM returned empty list or invalid format")
+        return items
+
+    except (requests.exceptions.Timeout, DeadlineExceeded) as e:
+        print(f"⏱️  LLM call ran out of time: {e}")
+        return llm_fallback(menu_text, filter_type, deadline, "LLM call exceeded the request deadline")
+    except Exception as e:
+        print(f"❌ LLM call failed: {e}")
+        import traceback
+        print(f"🐛 Full traceback: {traceback.format_exc()}")
+        # Fallback to keyword filtering
+        return llm_fallback(menu_text, filter_type, deadline, f"LLM call failed: {e}")
+
+# Lines outside this length range are never menu items
+MIN_ITEM_LINE = 10
+MAX_ITEM_LINE = 200
+PRICE_LINE_PATTERN = re.compile(r'\$[\d.]+|\d+\.\d{2}')
+
+def iter_lines(source):
+    """
+    Lazily split menu text into lines.
+    `source` is either a string or an iterable of text chunks (e.g. a
+    streamed upload); neither is ever split into a full list of lines.
+    """
+    if isinstance(source, str):
+        start = 0
+        while True:
+            end = source.find('\n', start)
+            if end == -1:
+                yield source[start:]
+                return
+            yield source[start:end]
+            start = end + 1
+
+    pending = ""
+    discarding = False
+    for chunk in source:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find('\n', start)
+            if end == -1:
+                break
+            if not discarding:
+                yield pending[start:end]
+            discarding = False
+            start = end + 1
+        pending = pending[start:]
+        # A line this long can't be a menu item - drop it rather than buffer it
+        if len(pending) > MAX_ITEM_LINE * 4:
+            pending = ""
+            discarding = True
+    if pending and not discarding:
+        yield pending
+
+def iter_candidate_items(lines):
+    """Yield lines that look like menu items (sensible length, with a price)"""
+    for line in lines:
+        line = line.strip()
+        if len(line) < MIN_ITEM_LINE or len(line) > MAX_ITEM_LINE:  # Skip very short or very long lines
+            continue
+
+        # Look for price patterns to identify menu items
+        if PRICE_LINE_PATTERN.search(line):
+            yield line
+
+def match_item(item: str, classification: dict, filter_type: str, source: str) -> Optional[MenuItem]:
+    """Turn a classified line into a MenuItem if it passes the filter, else None"""
+    is_vegan = classification['is_vegan']
+    is_vegetarian = classification['is_vegetarian']
+    reason = classification['reason']
+
+    # Apply filter based on type
+    should_include = False
+
+    if filter_type == 'vegan' and is_vegan:
+        should_include = True
+    elif filter_type == 'vegetarian' and is_vegetarian:
+        should_include = True
+    elif filter_type == 'nonvegetarian' and not is_vegetarian:
+        should_include = True
+    elif filter_type == 'all':
+        should_include = True
+
+    if not should_include:
+        return None
+    name, price = split_price(item)
+    return MenuItem(name, price, labels_for(is_vegan, is_vegetarian), f"{reason} ({source})")
+
+def iter_keyword_items(lines, filter_type: str, classify=None, source: Optional[str] = None):
+    """Classify candidate lines one at a time, yielding MenuItems that match the filter"""
+    if classify is None:
+        classify, source = get_item_classifier()
+
+    for item in iter_candidate_items(lines):
+        menu_item = match_item(item, classify(item), filter_type, source)
+        if menu_item is not None:
+            yield menu_item
+
+def filter_menu_with_keywords(menu_text, filter_type: str, classifier: Optional[tuple] = None,
+                              max_items: Optional[int] = None, deadline: Optional[Deadline] = None) -> list:
+    """
+    Traditional keyword-based filtering as fallback.
+    Items are classified with `classifier` ((classify, source) as returned by
+    get_item_classifier), defaulting to the configured CLASSIFIER_BACKEND.
+    `menu_text` may be a string or an iterable of text chunks.
+    With `max_items`, reading stops once that many items have matched and
+    the deadline (if given) is marked degraded to say the list is cut short.
+    """
+    classify, source = classifier or get_item_classifier()
+    print(f"🔤 Using {source.lower()} filtering for {filter_type} items")
+
+    with capture.stage("classify"):
+        matches = iter_keyword_items(iter_lines(menu_text), filter_type, classify, source)
+        if max_items is None:
+            filtered_items = list(matches)
+        else:
+            # Take one extra to tell "exactly max_items" from "more than that"
+            filtered_items = list(itertools.islice(matches, max_items + 1))
+            if len(filtered_items) > max_items:
+                filtered_items.pop()
+                if deadline is not None:
+                    deadline.mark_degraded(f"menu has more than {max_items} matching items, showing the first {max_items}")
+
+    print(f"📝 Keywords found {len(filtered_items)} {filter_type} items")
+    return filtered_items
+
+def iter_upload_text(fileobj, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Decode an uploaded file chunk by chunk"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def hash_upload(fileobj, chunk_size: int = UPLOAD_CHUNK_SIZE) -> tuple:
+    """Hash an uploaded file without holding it in memory; returns (hexdigest, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+def filter_uploaded_menu(fileobj, size: int, filter_type: str, deadline: Optional[Deadline] = None,
+                         priority: int = INTERACTIVE, backend: Optional[str] = None) -> list:
+    """
+    Filter an uploaded menu file. Small files go through filter_menu_items
+    like pasted text; larger ones are streamed through the keyword pipeline,
+    keeping at most UPLOAD_MAX_ITEMS items so memory stays flat no matter
+    how big the upload is.
+    """
+    engine_backend = get_backend(backend)
+    if engine_backend.uses_llm and size <= UPLOAD_LLM_MAX_BYTES:
+        return filter_menu_items("".join(iter_upload_text(fileobj)), filter_type, deadline, priority, engine_backend.name)
+    if engine_backend.uses_llm:
+        print(f"📦 Upload of {size} bytes is too large for the LLM, streaming through keyword filtering")
+        classifier = None
+    else:
+        classifier = engine_backend.classifier()
+    return filter_menu_with_keywords(iter_upload_text(fileobj), filter_type, classifier,
+                                     max_items=UPLOAD_MAX_ITEMS, deadline=deadline)
+
+
+class KeywordBackend:
+    """Keyword matching on price-bearing lines - instant and free"""
+
+    name = "keywords"
+    uses_llm = False
+
+    def classifier(self) -> tuple:
+        """(classify function, label shown in reasons) for single items"""
+        return classify_menu_item_keywords, "Keywords"
+
+    def filter(self, menu_text, filter_type: str, deadline: Optional[Deadline] = None,
+               priority: int = INTERACTIVE) -> list:
+        return filter_menu_with_keywords(menu_text, filter_type, self.classifier())
+
+
+class LocalBackend(KeywordBackend):
+    """Same pipeline as keywords, classified by the model trained from LLM labels"""
+
+    name = "local"
+
+    def classifier(self) -> tuple:
+        model = load_local_classifier()
+        if model is not None:
+            return model.classify, "Local model"
+        print("⚠️  No trained local classifier found, using keyword classification")
+        return super().classifier()
+
+
+class LLMBackend:
+    """Whole-menu analysis by the LLM, falling back to keywords on failure"""
+
+    name = "llm"
+    uses_llm = True
+
+    def filter(self, menu_text, filter_type: str, deadline: Optional[Deadline] = None,
+               priority: int = INTERACTIVE) -> list:
+        return filter_menu_with_llm(menu_text, filter_type, deadline, priority)
+
+
+class HybridBackend:
+    """
+    Classify price-bearing lines with the item classifier and only send the
+    lines it isn't confident about to the LLM. Menus where item lines are
+    only a small part of the text (most scraped pages put names and prices
+    on separate lines) go to the LLM whole.
+    """
+
+    name = "hybrid"
+    uses_llm = True
+
+    def filter(self, menu_text, filter_type: str, deadline: Optional[Deadline] = None,
+               priority: int = INTERACTIVE) -> list:
+        # Only LLM-sized menus reach this backend, so holding the lines is fine
+        lines = [line for line in iter_lines(menu_text) if line.strip()]
+        candidates = list(iter_candidate_items(lines))
+        if len(candidates) < HYBRID_MIN_COVERAGE * len(lines):
+            print(f"🔀 Hybrid: only {len(candidates)} of {len(lines)} lines look like items, "
+                  f"sending the whole menu to the LLM")
+            return filter_menu_with_llm(menu_text, filter_type, deadline, priority)
+
+        classify, source = get_item_classifier()
+        items = []
+        uncertain = []
+        for line in candidates:
+            classification = classify(line)
+            if classification.get("confident") or filter_type == 'all':
+                menu_item = match_item(line, classification, filter_type, source)
+                if menu_item is not None:
+                    items.append(menu_item)
+            else:
+                uncertain.append(line)
+
+        print(f"🔀 Hybrid: {len(items)} items decided locally, {len(uncertain)} lines sent to the LLM")
+        if uncertain:
+            items.extend(filter_menu_with_llm("\n".join(uncertain), filter_type, deadline, priority))
+        return items
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (KeywordBackend(), LocalBackend(), LLMBackend(), HybridBackend())
+}
+
+
+def get_backend(name: Optional[str] = None):
+    """Look up a filtering backend by name (FILTER_BACKEND when not given)"""
+    name = (name or FILTER_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown filter backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+def run_filter_request(inputs: dict, deadline: Deadline, upload: Optional[tuple] = None,
+                       priority: int = INTERACTIVE) -> tuple:
+    """
+    Run the fetch -> extract -> classify -> parse pipeline for one request,
+    without caching.
+    `inputs` has input_type ("url", "text" or "upload"), filter_type,
+    menu_url or menu_text, and optionally backend; `upload` is
+    (file object, size) for uploads. Returns (items, error_message).
+    """
+    filter_type = inputs["filter_type"]
+    engine_backend = get_backend(inputs.get("backend"))
+    if inputs["input_type"] == "url":
+        # Leave enough of the budget for the LLM stage that follows
+        reserve = LLM_MIN_BUDGET if engine_backend.uses_llm else 0.0
+        menu_content = extract_menu_text(inputs["menu_url"], deadline, reserve)
+        if menu_content.startswith('Error'):
+            return [], menu_content
+        # Debug: show first 500 characters of extracted content
+        print(f"Extracted content preview: {menu_content[:500]}...")
+        items = filter_menu_items(menu_content, filter_type, deadline, priority, engine_backend.name)
+    elif inputs["input_type"] == "upload":
+        fileobj, size = upload
+        items = filter_uploaded_menu(fileobj, size, filter_type, deadline, priority, engine_backend.name)
+    else:
+        items = filter_menu_items(inputs["menu_text"], filter_type, deadline, priority, engine_backend.name)
+
+    if items is None:
+        items = []
+        print("⚠️  Warning: filter_menu_items returned None, using empty list")
+    return items, None
+
+def run_captured_request(inputs: dict, deadline: Deadline, upload: Optional[tuple] = None,
+                         priority: int = INTERACTIVE) -> tuple:
+    """run_filter_request(), recorded to the traffic log when capture is enabled"""
+    inputs = {
+        **inputs,
+        "backend": get_backend(inputs.get("backend")).name,
+        "classifier_backend": CLASSIFIER_BACKEND,
+    }
+    if capture.CAPTURE_ENABLED and upload is not None:
+        fileobj, size = upload
+        if size > capture.CAPTURE_MAX_INPUT_BYTES:
+            print(f"📼 Upload of {size} bytes is too large to capture")
+            return run_filter_request(inputs, deadline, upload, priority)
+        inputs["upload_b64"] = base64.b64encode(fileobj.read()).decode("ascii")
+        fileobj.seek(0)
+
+    with capture.capturing(inputs) as recording:
+        items, error_message = run_filter_request(inputs, deadline, upload, priority)
+        if recording is not None:
+            recording.set_result(items, error_message, deadline.degraded)
+    return items, error_message
+
+
+async def afilter_menu_items(menu_text: str, filter_type: str, deadline: Optional[Deadline] = None,
+                             priority: int = INTERACTIVE, backend: Optional[str] = None) -> list:
+    """filter_menu_items() without blocking the event loop"""
+    return await asyncio.to_thread(filter_menu_items, menu_text, filter_type, deadline, priority, backend)
+
+
+async def arun_captured_request(inputs: dict, deadline: Deadline, upload: Optional[tuple] = None,
+                                priority: int = INTERACTIVE) -> tuple:
+    """run_captured_request() without blocking the event loop"""
+    return await asyncio.to_thread(run_captured_request, inputs, deadline, upload, priority)
@@ -0,0 +1,161 @@
+"""
+Typed menu item records and the parsers that produce them.
+
+Both the keyword path and the LLM path return lists of MenuItem. The LLM can
+answer either in compact JSON (structured mode) or as one item per line;
+both formats are handled here so every entry point parses them the same way.
+"""
+import json
+import re
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - the stdlib parser works too
+    orjson = None
+
+KNOWN_LABELS = ("vegan", "vegetarian", "nonvegetarian")
+
+# "$12.99", "$ 8", "12.50" - the last one must have cents to avoid matching "3 tacos"
+# Whole-dollar amounts, with or without thousands separators ("1,299" or "1299")
+_AMOUNT = r"(?:\d{1,3}(?:,\d{3})+|\d+)"
+PRICE_PATTERN = re.compile(rf"\$\s?({_AMOUNT}(?:\.\d{{1,2}})?)|\b({_AMOUNT}\.\d{{2}})\b")
+# Bullets and list numbering at the start of an LLM line ("- ", "* ", "1. ", "2) ")
+BULLET_PATTERN = re.compile(r"^(?:[*•\-–]+\s*|\d{1,3}[.)]\s+)")
+# A Markdown code fence around a whole answer, with an optional language tag
+FENCE_PATTERN = re.compile(r"^```[\w-]*[ \t]*\n?|\n?```$")
+# Separators left dangling once the price is cut out of a line
+DANGLING_PATTERN = re.compile(r"\s*(?:[-–—:|,]\s*)+$")
+
+# Instructions added to prompts when structured output is on
+JSON_FORMAT_INSTRUCTIONS = """Reply with JSON only, in this exact compact form:
+{"items":[{"n":"dish name","p":12.99,"l":["vegan"]}]}
+"n" is the dish name without the price, "p" is the price as a number (null if not shown),
+"l" lists every label that applies from: vegan, vegetarian, nonvegetarian."""
+
+
+class MenuItem:
+    """One menu item. Slotted so large results stay small in memory."""
+
+    __slots__ = ("name", "price", "labels", "reason")
+
+    def __init__(self, name: str, price: Optional[float] = None, labels: tuple = (), reason: str = ""):
+        self.name = name
+        self.price = price
+        self.labels = labels
+        self.reason = reason
+
+    def __repr__(self):
+        return f"MenuItem({self.name!r}, price={self.price!r}, labels={self.labels!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, MenuItem):
+            return NotImplemented
+        return (self.name, self.price, self.labels, self.reason) == (other.name, other.price, other.labels, other.reason)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "price": self.price, "labels": list(self.labels), "reason": self.reason}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MenuItem":
+        return cls(data["name"], data.get("price"), tuple(data.get("labels", ())), data.get("reason", ""))
+
+
+def labels_for(is_vegan: bool, is_vegetarian: bool) -> tuple:
+    """Labels implied by a vegan/vegetarian classification"""
+    if is_vegan:
+        return ("vegan", "vegetarian")
+    if is_vegetarian:
+        return ("vegetarian",)
+    return ("nonvegetarian",)
+
+
+def split_price(text: str) -> tuple:
+    """Split the first price out of a line, returning (name, price or None)"""
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return text.strip(), None
+    price = float((match.group(1) or match.group(2)).replace(",", ""))
+    # "Salad - $12.99 - fresh greens": drop the separator before the price so
+    # the two around it collapse into one
+    before = DANGLING_PATTERN.sub("", text[:match.start()]).rstrip()
+    after = text[match.end():].lstrip()
+    name = (before + ("" if after.startswith(",") else " ") + after).strip()
+    name = DANGLING_PATTERN.sub("", name)
+    name = re.sub(r"^(?:[-–—:|,]\s*)+", "", name)
+    return name or text.strip(), price
+
+
+def parse_llm_line_items(result_text: str, reason: str, labels: tuple = ()) -> list:
+    """Parse a plain text LLM answer with one item per line"""
+    items = []
+    for line in result_text.split('\n'):
+        line = line.strip()
+        # Skip empty lines, numbers, or very short text
+        if not line or len(line) < 5:
+            continue
+        # Skip lines that look like headings or instructions
+        if line.endswith(':') or line.lower().startswith('here') or line.lower().startswith('note'):
+            continue
+        # Clean up markdown and bullets without eating digits from dish names
+        line = BULLET_PATTERN.sub("", line).replace("**", "").strip()
+        if line:
+            name, price = split_price(line)
+            items.append(MenuItem(name, price, labels, reason))
+    return items
+
+
+def _loads(text: str):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_llm_json_items(result_text: str, reason: str, labels: tuple = ()) -> Optional[list]:
+    """
+    Parse a structured (compact JSON) LLM answer.
+    Returns None if the answer isn't the JSON we asked for, so the caller can
+    fall back to line parsing. Malformed entries are skipped.
+    """
+    # Some models still wrap JSON in a code fence ("```json ... ```")
+    text = FENCE_PATTERN.sub("", result_text.strip())
+    try:
+        payload = _loads(text)
+    except ValueError:
+        return None
+    if isinstance(payload, dict):
+        entries = payload.get("items")
+    else:
+        entries = payload
+    if not isinstance(entries, list):
+        return None
+
+    items = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get("n", entry.get("name"))
+        if not isinstance(name, str) or not name.strip():
+            continue
+        price = entry.get("p", entry.get("price"))
+        if isinstance(price, str):
+            _, price = split_price(price if "$" in price else f"${price}")
+        elif isinstance(price, bool) or not isinstance(price, (int, float)):
+            price = None
+        item_labels = entry.get("l", entry.get("labels"))
+        if isinstance(item_labels, list):
+            item_labels = tuple(label for label in item_labels if label in KNOWN_LABELS) or labels
+        else:
+            item_labels = labels
+        items.append(MenuItem(name.strip(), float(price) if price is not None else None, item_labels, reason))
+    return items
+
+
+def parse_llm_items(result_text: str, reason: str, labels: tuple = (), structured: bool = False) -> list:
+    """Parse an LLM answer, trying compact JSON first when structured output was requested"""
+    if structured:
+        items = parse_llm_json_items(result_text, reason, labels)
+        if items is not None:
+            return items
+        print("⚠️  LLM didn't return valid JSON, parsing the answer line by line")
+    return parse_llm_line_items(result_text, reason, labels)
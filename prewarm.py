@@ -0,0 +1,163 @@
+"""
+Background pre-warming of popular restaurant menus.
+
+PopularityTracker counts how often (and how recently) each URL + filter is
+requested. PrewarmScheduler runs in a daemon thread and, during off-peak
+hours, re-fetches and reclassifies the hottest ones before they are needed,
+spending at most PREWARM_LLM_BUDGET LLM calls per off-peak window.
+
+The scheduler knows nothing about the web app: it is given a `refresh`
+callback that does the actual work and a `needs_refresh` check.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() == "true"
+# Local hours during which pre-warming may run, e.g. "1-6" or "22-5"; empty = any time
+PREWARM_OFFPEAK_HOURS = os.getenv("PREWARM_OFFPEAK_HOURS", "1-6")
+# LLM calls pre-warming may spend per off-peak window
+PREWARM_LLM_BUDGET = int(os.getenv("PREWARM_LLM_BUDGET", "50"))
+# How many of the most popular URL/filter pairs to keep warm
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+# Seconds between scheduler passes
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "300"))
+# Popularity half-life in seconds - older requests count for less
+PREWARM_HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", str(6 * 3600)))
+# Ignore URLs requested fewer times than this (after decay)
+PREWARM_MIN_SCORE = float(os.getenv("PREWARM_MIN_SCORE", "2"))
+# Most (url, filter_type) pairs tracked at once; the least popular are evicted past this
+PREWARM_MAX_TRACKED = int(os.getenv("PREWARM_MAX_TRACKED", "10000"))
+
+
+def parse_hours(spec: str) -> Optional[tuple]:
+    """Parse "start-end" local hours; returns None to mean "any time" """
+    spec = spec.strip()
+    if not spec:
+        return None
+    start, end = (int(part) for part in spec.split("-", 1))
+    return start % 24, end % 24
+
+
+def in_window(hour: int, window: Optional[tuple]) -> bool:
+    """Is `hour` inside [start, end), allowing windows that wrap past midnight"""
+    if window is None:
+        return True
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class PopularityTracker:
+    """Exponentially decayed request counts per (url, filter_type)"""
+
+    def __init__(self, half_life: float = PREWARM_HALF_LIFE, max_tracked: int = PREWARM_MAX_TRACKED):
+        self.decay = math.log(2) / half_life
+        self.max_tracked = max(1, max_tracked)
+        self._lock = threading.Lock()
+        # (url, filter_type) -> [score at last_seen, last_seen, total count]
+        self._stats = {}
+
+    def _score(self, stats: list, now: float) -> float:
+        score, last_seen, _ = stats
+        return score * math.exp(-self.decay * (now - last_seen))
+
+    def record(self, url: str, filter_type: str) -> None:
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get((url, filter_type))
+            if stats is None:
+                if len(self._stats) >= self.max_tracked:
+                    self._evict(now)
+                self._stats[(url, filter_type)] = [1.0, now, 1]
+            else:
+                stats[0] = self._score(stats, now) + 1.0
+                stats[1] = now
+                stats[2] += 1
+
+    def _evict(self, now: float) -> None:
+        """Drop the least popular tenth of the table (called with the lock held)"""
+        scored = sorted((self._score(stats, now), key) for key, stats in self._stats.items())
+        for _, key in scored[:max(1, len(scored) // 10)]:
+            del self._stats[key]
+
+    def hot_set(self, limit: int = PREWARM_TOP_N, min_score: float = PREWARM_MIN_SCORE) -> list:
+        """Most popular (url, filter_type) pairs, hottest first"""
+        now = time.time()
+        with self._lock:
+            scored = [(self._score(stats, now), key) for key, stats in self._stats.items()]
+            # Forget entries that have decayed to nothing so the table stays small
+            for score, key in scored:
+                if score < 0.01:
+                    del self._stats[key]
+        scored = [item for item in scored if item[0] >= min_score]
+        scored.sort(reverse=True)
+        return [key for _, key in scored[:limit]]
+
+
+class PrewarmScheduler:
+    def __init__(
+        self,
+        tracker: PopularityTracker,
+        refresh: Callable[[str, str], int],
+        needs_refresh: Callable[[str, str], bool],
+        budget: int = PREWARM_LLM_BUDGET,
+        offpeak_hours: str = PREWARM_OFFPEAK_HOURS,
+        interval: float = PREWARM_INTERVAL,
+    ):
+        """
+        `refresh(url, filter_type)` re-fetches and reclassifies a menu and
+        returns how many LLM calls it sent. `needs_refresh(url, filter_type)`
+        says whether the cached result is missing or getting stale.
+        """
+        self.tracker = tracker
+        self.refresh = refresh
+        self.needs_refresh = needs_refresh
+        self.budget = budget
+        self.window = parse_hours(offpeak_hours)
+        self.interval = interval
+        self.spent = 0
+        self._in_window = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        """One scheduler pass; returns how many menus were refreshed"""
+        if not in_window(datetime.now().hour, self.window):
+            self._in_window = False
+            return 0
+        if not self._in_window:
+            # A new off-peak window starts with a fresh budget
+            self._in_window = True
+            self.spent = 0
+
+        refreshed = 0
+        for url, filter_type in self.tracker.hot_set():
+            if self._stop.is_set() or self.spent >= self.budget:
+                break
+            if not self.needs_refresh(url, filter_type):
+                continue
+            try:
+                self.spent += self.refresh(url, filter_type)
+                refreshed += 1
+            except Exception as e:
+                print(f"⚠️  Pre-warm of {url} ({filter_type}) failed: {e}")
+        if refreshed:
+            print(f"🔥 Pre-warmed {refreshed} menus ({self.spent}/{self.budget} LLM calls used this window)")
+        return refreshed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="menu-prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
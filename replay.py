@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Replay captured traffic against the current code.
+
+Reads the log written with CAPTURE_ENABLED=true, re-runs every request
+with its page fetches and LLM calls served from the log, and reports
+per-stage latency (captured vs now) and any requests whose output changed.
+Fetch and LLM times are near zero on replay since nothing touches the
+network, so compare the parse / classify stages for code changes.
+
+Usage:
+    python replay.py [--log captures/traffic.jsonl.gz] [--limit N] [--diffs] [--verbose]
+"""
+import argparse
+import base64
+import contextlib
+import difflib
+import io
+import statistics
+import time
+
+import capture
+import menu_engine
+from deadline import Deadline
+
+
+def describe(item: dict) -> str:
+    price = f"${item['price']:.2f}" if item.get("price") is not None else "-"
+    return f"{item['name']} | {price} | {','.join(item.get('labels', []))} | {item.get('reason', '')}"
+
+
+def replay_record(record: dict) -> tuple:
+    """Re-run one captured request. Returns (result dict, stage timings)."""
+    inputs = dict(record["inputs"])
+    # Run with the configuration the request was captured under
+    menu_engine.CLASSIFIER_BACKEND = inputs.get("classifier_backend", menu_engine.CLASSIFIER_BACKEND)
+    if menu_engine.get_backend(inputs["backend"]).uses_llm and not menu_engine.OPENAI_API_KEY:
+        menu_engine.OPENAI_API_KEY = "replay"
+
+    upload = None
+    if inputs["input_type"] == "upload":
+        data = base64.b64decode(inputs["upload_b64"])
+        upload = (io.BytesIO(data), len(data))
+
+    # Nothing waits on the network during replay, so the budget isn't tied to
+    # the wall clock; deadline fallbacks in the capture replay as missing calls
+    deadline = Deadline(float("inf"))
+    with capture.replaying(record) as source:
+        started = time.perf_counter()
+        items, error_message = menu_engine.run_filter_request(inputs, deadline, upload)
+        source.add_timing("total", time.perf_counter() - started)
+
+    result = {
+        "items": [item.to_dict() for item in items],
+        "error_message": error_message,
+        "degraded": deadline.degraded,
+    }
+    return result, source.timings
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against the current code")
+    parser.add_argument("--log", default=capture.CAPTURE_PATH)
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the first N requests")
+    parser.add_argument("--diffs", action="store_true", help="Print output diffs for changed requests")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own debug output")
+    args = parser.parse_args()
+
+    captured_timings = {}
+    replayed_timings = {}
+    changed = []
+    total = 0
+
+    for record in capture.read_records(args.log):
+        if args.limit is not None and total >= args.limit:
+            break
+        if record.get("result") is None:
+            continue
+        total += 1
+
+        output = io.StringIO()
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(output):
+            try:
+                result, timings = replay_record(record)
+            except Exception as e:
+                result, timings = {"items": [], "error_message": f"replay crashed: {e}", "degraded": False}, {}
+
+        for stage_name, seconds in record["timings"].items():
+            captured_timings.setdefault(stage_name, []).append(seconds)
+        for stage_name, seconds in timings.items():
+            replayed_timings.setdefault(stage_name, []).append(seconds)
+
+        before = record["result"]
+        if before != result:
+            changed.append((record, before, result))
+
+    print("=" * 60)
+    print(f"Replayed {total} requests from {args.log}")
+    print("=" * 60)
+    print(f"{'Stage':>10} {'Captured p50':>14} {'Replay p50':>12} {'Captured p95':>14} {'Replay p95':>12}")
+    for stage_name in ("fetch", "parse", "llm", "classify", "total"):
+        before, after = captured_timings.get(stage_name), replayed_timings.get(stage_name)
+        if not before and not after:
+            continue
+        cells = []
+        for values in (before, after):
+            cells.append((f"{statistics.median(values) * 1000:.1f}ms", f"{percentile(values, 0.95) * 1000:.1f}ms")
+                         if values else ("-", "-"))
+        print(f"{stage_name:>10} {cells[0][0]:>14} {cells[1][0]:>12} {cells[0][1]:>14} {cells[1][1]:>12}")
+
+    print(f"\n{len(changed)} of {total} requests produced different output")
+    for record, before, after in changed:
+        inputs = record["inputs"]
+        source = inputs.get("menu_url") or f"{inputs['input_type']} input"
+        print(f"\n🔀 {record['id'][:12]} {inputs['filter_type']} - {source}")
+        if before["error_message"] != after["error_message"]:
+            print(f"   error: {before['error_message']!r} -> {after['error_message']!r}")
+        if before["degraded"] != after["degraded"]:
+            print(f"   degraded: {before['degraded']} -> {after['degraded']}")
+        print(f"   items: {len(before['items'])} -> {len(after['items'])}")
+        if args.diffs:
+            diff = difflib.unified_diff(
+                [describe(item) for item in before["items"]],
+                [describe(item) for item in after["items"]],
+                "captured", "replayed", lineterm="",
+            )
+            for line in diff:
+                print(f"   {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the local classifier, trained on a small fixture label log.
+
+Run with: python -m unittest test_local_classifier
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from local_classifier import LABELS, LocalClassifier, hashed_features, load_examples, log_labels
+
+# A tiny label log in the format log_labels() writes
+FIXTURE_RECORDS = [
+    {"line": "Vegan Buddha Bowl", "label": "vegan"},
+    {"line": "Tofu Stir Fry with vegetables", "label": "vegan"},
+    {"line": "Chickpea Curry with rice", "label": "vegan"},
+    {"line": "Lentil Soup", "label": "vegan"},
+    {"line": "Cheese Pizza", "label": "vegetarian"},
+    {"line": "Margherita Pizza with mozzarella", "label": "vegetarian"},
+    {"line": "Paneer Tikka", "label": "vegetarian"},
+    {"line": "Egg Fried Rice", "label": "vegetarian"},
+    {"line": "Beef Burger", "label": "nonvegetarian"},
+    {"line": "Grilled Chicken Breast", "label": "nonvegetarian"},
+    {"line": "Salmon Fillet", "label": "nonvegetarian"},
+    {"line": "Pork Ribs", "label": "nonvegetarian"},
+    # Returned by the vegetarian filter too - the strictest label must win
+    {"line": "Vegan Buddha Bowl", "label": "vegetarian"},
+    # Ignored: unknown label and missing line
+    {"line": "House Special", "label": "spicy"},
+    {"label": "vegan"},
+]
+
+
+class LocalClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.labels_path = os.path.join(self.tmp.name, "llm_labels.jsonl")
+        with open(self.labels_path, "w", encoding="utf-8") as f:
+            for record in FIXTURE_RECORDS:
+                f.write(json.dumps(record) + "\n")
+
+    def trained_model(self) -> LocalClassifier:
+        model = LocalClassifier()
+        model.train(load_examples(self.labels_path))
+        return model
+
+    def test_hashed_features_are_deterministic_and_bounded(self):
+        features = hashed_features("Vegan Buddha Bowl")
+        self.assertEqual(features, hashed_features("vegan buddha bowl"))
+        self.assertTrue(features)
+        self.assertTrue(all(isinstance(index, int) and index >= 0 for index in features))
+        self.assertEqual(hashed_features(""), {})
+
+    def test_load_examples_keeps_strictest_label(self):
+        examples = dict(load_examples(self.labels_path))
+        self.assertEqual(examples["Vegan Buddha Bowl"], "vegan")
+        self.assertNotIn("House Special", examples)
+        self.assertEqual(len(examples), 12)
+
+    def test_log_labels_round_trips_through_load_examples(self):
+        path = os.path.join(self.tmp.name, "logged.jsonl")
+        log_labels([("Beef Burger", "nonvegetarian"), ("Cheese Pizza", "vegetarian"), ("Mystery", None)], path)
+        self.assertEqual(sorted(load_examples(path)), [("Beef Burger", "nonvegetarian"), ("Cheese Pizza", "vegetarian")])
+
+    def test_train_fits_fixture_and_predicts_labels(self):
+        model = self.trained_model()
+        for line, label in load_examples(self.labels_path):
+            self.assertEqual(model.predict(line), label, line)
+        self.assertEqual(model.predict("beef and pork platter"), "nonvegetarian")
+
+    def test_classify_matches_keyword_classifier_shape(self):
+        result = self.trained_model().classify("Grilled Chicken Breast")
+        self.assertFalse(result["is_vegan"])
+        self.assertFalse(result["is_vegetarian"])
+        self.assertIn("reason", result)
+        self.assertIn("confident", result)
+
+    def test_save_load_round_trip(self):
+        model = self.trained_model()
+        path = os.path.join(self.tmp.name, "model.json")
+        model.save(path)
+        loaded = LocalClassifier.load(path)
+        for line in ("Lentil Soup", "Paneer Tikka", "Salmon Fillet", "something new entirely"):
+            features = hashed_features(line)
+            self.assertEqual(loaded.predict(line), model.predict(line))
+            for label in LABELS:
+                self.assertAlmostEqual(loaded.scores(features)[label], model.scores(features)[label])
+
+
+if __name__ == "__main__":
+    unittest.main()
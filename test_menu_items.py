@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Offline tests for price splitting and LLM answer parsing.
+
+Run with: python -m unittest test_menu_items
+"""
+import unittest
+
+from menu_items import parse_llm_items, parse_llm_json_items, split_price
+
+
+class SplitPriceTest(unittest.TestCase):
+    def test_price_at_end(self):
+        self.assertEqual(split_price("Caesar Salad $12.99"), ("Caesar Salad", 12.99))
+        self.assertEqual(split_price("Salad - $12.99"), ("Salad", 12.99))
+
+    def test_price_without_dollar_sign_needs_cents(self):
+        self.assertEqual(split_price("Garden Salad 12.50"), ("Garden Salad", 12.5))
+        self.assertEqual(split_price("3 tacos"), ("3 tacos", None))
+
+    def test_separators_around_price_collapse_into_one(self):
+        self.assertEqual(split_price("Salad - $12.99 - fresh greens"), ("Salad - fresh greens", 12.99))
+        self.assertEqual(split_price("Salad $12.99 - fresh greens"), ("Salad - fresh greens", 12.99))
+        self.assertEqual(split_price("Bowl | $9.50 | rice"), ("Bowl | rice", 9.5))
+        self.assertEqual(split_price("Salad: $12.99, fresh"), ("Salad, fresh", 12.99))
+
+    def test_thousands_separators(self):
+        self.assertEqual(split_price("Tasting Menu 1,299.00"), ("Tasting Menu", 1299.0))
+        self.assertEqual(split_price("Wagyu $1,299"), ("Wagyu", 1299.0))
+
+
+class ParseLLMItemsTest(unittest.TestCase):
+    def test_compact_json_object(self):
+        items = parse_llm_json_items('{"items":[{"n":"Tofu Curry","p":12,"l":["vegan"]}]}', "r")
+        self.assertEqual([(item.name, item.price, item.labels) for item in items], [("Tofu Curry", 12.0, ("vegan",))])
+
+    def test_fenced_json_object(self):
+        items = parse_llm_json_items('```json\n{"items":[{"n":"Tofu Curry","p":12}]}\n```', "r")
+        self.assertEqual([item.name for item in items], ["Tofu Curry"])
+
+    def test_fenced_json_array(self):
+        items = parse_llm_json_items('```json\n[{"n":"Tofu Curry","p":12},{"n":"Dal","p":"9.50"}]\n```', "r")
+        self.assertEqual([(item.name, item.price) for item in items], [("Tofu Curry", 12.0), ("Dal", 9.5)])
+
+    def test_invalid_json_falls_back_to_lines(self):
+        self.assertIsNone(parse_llm_json_items("Tofu Curry $12.00", "r"))
+        items = parse_llm_items("- Tofu Curry $12.00\n- Dal $9.50", "r", labels=("vegan",), structured=True)
+        self.assertEqual([(item.name, item.price, item.labels) for item in items],
+                         [("Tofu Curry", 12.0, ("vegan",)), ("Dal", 9.5, ("vegan",))])
+
+
+if __name__ == "__main__":
+    unittest.main()